@@ -5,6 +5,7 @@ from app.db.events import get_db
 from app.db.models import Agent, APIKey
 from app.api.models import AgentRegister, AgentResponse
 from app.core.security import get_api_key
+from app.services.threat_counter import threat_totals
 from typing import List
 
 router = APIRouter()
@@ -17,7 +18,7 @@ async def list_agents(
 ):
     """List all agents for a tenant with metrics"""
     from sqlalchemy import func
-    from app.db.models import Message, ToolEvent
+    from app.db.models import ToolEvent
     from datetime import datetime, timedelta
     
     result = await db.execute(
@@ -26,26 +27,12 @@ async def list_agents(
     agents = result.scalars().all()
     
     # Enhance with metrics
+    totals = await threat_totals(db, [agent.id for agent in agents])
+
     agent_list = []
     for agent in agents:
-        # Get message count (last 24h)
-        msg_result = await db.execute(
-            select(func.count(Message.id)).filter(
-                Message.agent_id == agent.id,
-                Message.timestamp >= datetime.utcnow() - timedelta(hours=24)
-            )
-        )
-        calls_24h = msg_result.scalar() or 0
-        
-        # Get risk score (% of blocked messages in last 24h)
-        blocked_result = await db.execute(
-            select(func.count(Message.id)).filter(
-                Message.agent_id == agent.id,
-                Message.timestamp >= datetime.utcnow() - timedelta(hours=24),
-                Message.decision.in_(["block", "flag"])
-            )
-        )
-        blocked_count = blocked_result.scalar() or 0
+        # Message count and risk score (% of blocked/flagged messages) over the last 24h
+        calls_24h, blocked_count = totals[agent.id]
         risk_score = int((blocked_count / calls_24h * 100)) if calls_24h > 0 else 0
         
         # Get live actions count (recent tool calls)
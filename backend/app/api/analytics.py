@@ -1,43 +1,35 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func, desc
-from app.db.events import get_db
-from app.db.models import Message
+from app.db.events import get_db, AsyncSessionLocal
+from app.db.models import Message, APIKey
+from app.api.models import DashboardBundleRequest
+from app.core.cache import cached
+from app.core.config import settings
+from app.core.security import get_api_key
+from app.services.threat_counter import threat_scores
+from app.services.sketch_store import sketch_store, PERIOD_HOURS, distinct_prompts, top_items
 from typing import List, Dict, Any
 from datetime import datetime, timedelta
+import asyncio
+import time
 
 router = APIRouter()
 
 @router.get("/threat-score")
+@cached("threat-score", ttl=5)
 async def get_threat_score(agentId: int, db: AsyncSession = Depends(get_db)):
-    # Calculate score based on blocked/flagged ratio in last 24h
-    since = datetime.utcnow() - timedelta(hours=24)
-    
-    total_query = select(func.count()).where(
-        Message.agent_id == agentId,
-        Message.timestamp >= since
-    )
-    total = (await db.execute(total_query)).scalar() or 0
-    
-    if total == 0:
-        return {"score": 0, "level": "low"}
-        
-    unsafe_query = select(func.count()).where(
-        Message.agent_id == agentId,
-        Message.timestamp >= since,
-        Message.decision.in_(["block", "flag"])
-    )
-    unsafe = (await db.execute(unsafe_query)).scalar() or 0
-    
-    score = int((unsafe / total) * 100)
-    level = "low"
-    if score > 30: level = "medium"
-    if score > 70: level = "high"
-    
-    return {"score": score, "level": level}
+    # Score based on blocked/flagged ratio in last 24h, served from the sliding-window counter
+    scores = await threat_scores(db, [agentId])
+    return scores[agentId]
+
+@router.get("/threat-scores")
+async def get_threat_scores(agentIds: List[int] = Query(...), db: AsyncSession = Depends(get_db)):
+    return await threat_scores(db, list(dict.fromkeys(agentIds)))
 
 @router.get("/incidents/timeline")
+@cached("incidents-timeline", ttl=30)
 async def get_incident_timeline(agentId: int, period: str = "24h", db: AsyncSession = Depends(get_db)):
     hours = 24
     if period == "7d": hours = 168
@@ -60,6 +52,7 @@ async def get_incident_timeline(agentId: int, period: str = "24h", db: AsyncSess
     return [{"time": row[0].isoformat(), "count": row[1]} for row in rows]
 
 @router.get("/usage")
+@cached("usage", ttl=60)
 async def get_model_usage(agentId: int, period: str = "30d", db: AsyncSession = Depends(get_db)):
     days = 30
     if period == "7d": days = 7
@@ -81,6 +74,7 @@ async def get_model_usage(agentId: int, period: str = "30d", db: AsyncSession =
     return [{"date": row[0].strftime("%Y-%m-%d"), "count": row[1]} for row in rows]
 
 @router.get("/threat-score/history")
+@cached("threat-score-history", ttl=60)
 async def get_risk_score_history(agentId: int, period: str = "30d", db: AsyncSession = Depends(get_db)):
     days = 30
     since = datetime.utcnow() - timedelta(days=days)
@@ -119,6 +113,7 @@ async def get_risk_score_history(agentId: int, period: str = "30d", db: AsyncSes
     return history
 
 @router.get("/actions")
+@cached("actions", ttl=15)
 async def get_agent_actions(agentId: int, period: str = "24h", db: AsyncSession = Depends(get_db)):
     from app.db.models import ToolEvent
     hours = 24
@@ -135,6 +130,7 @@ async def get_agent_actions(agentId: int, period: str = "24h", db: AsyncSession
     return [{"name": row[0], "count": row[1]} for row in rows]
 
 @router.get("/violations/categories")
+@cached("violation-categories", ttl=30)
 async def get_violation_categories(agentId: int, period: str = "30d", db: AsyncSession = Depends(get_db)):
     from app.db.models import Incident
     days = 30
@@ -161,3 +157,112 @@ async def get_violation_categories(agentId: int, period: str = "30d", db: AsyncS
         categories[classification] = count
         
     return categories
+
+async def _sketch_window(agentId: int, period: str, db: AsyncSession):
+    if period not in PERIOD_HOURS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(PERIOD_HOURS)}")
+    return await sketch_store.window(db, agentId, PERIOD_HOURS[period])
+
+@router.get("/prompts/distinct")
+async def get_distinct_prompts(agentId: int, period: str = "24h", db: AsyncSession = Depends(get_db)):
+    # Approximate (HyperLogLog) count of distinct user prompts
+    sketches = await _sketch_window(agentId, period, db)
+    return distinct_prompts(sketches)
+
+@router.get("/phrases/top")
+async def get_top_attack_phrases(agentId: int, period: str = "24h", k: int = Query(10, ge=1, le=64), db: AsyncSession = Depends(get_db)):
+    # Most frequent word trigrams in blocked/flagged prompts (Space-Saving, bounded by Count-Min)
+    sketches = await _sketch_window(agentId, period, db)
+    return top_items(sketches.phrases, sketches.phrase_counts, k, "phrase")
+
+@router.get("/actions/args/top")
+async def get_top_tool_args(agentId: int, period: str = "24h", k: int = Query(10, ge=1, le=64), db: AsyncSession = Depends(get_db)):
+    # Heavy-hitter tool calls by tool name and arguments
+    sketches = await _sketch_window(agentId, period, db)
+    return top_items(sketches.tool_args, sketches.tool_arg_counts, k, "tool_call")
+
+
+async def _agent_widget(agentId: int, db: AsyncSession):
+    from app.db.models import Agent
+    agent = await db.get(Agent, agentId)
+    is_connected = bool(agent.last_seen and (datetime.utcnow() - agent.last_seen).total_seconds() < 60)
+    return {
+        "id": agent.id,
+        "name": agent.name,
+        "model_info": agent.model_info,
+        "allowed_tools": agent.allowed_tools,
+        "last_seen": agent.last_seen.isoformat() if agent.last_seen else None,
+        "is_connected": is_connected,
+        "connection_type": "url" if agent.target_url else "sdk"
+    }
+
+async def _autonomy_drift_widget(agentId: int, db: AsyncSession, period: str = "24h"):
+    from app.api.metrics import get_autonomy_drift
+    return await get_autonomy_drift(agentId=agentId, time_range=period, db=db)
+
+# widget name -> (handler, accepts period)
+BUNDLE_WIDGETS = {
+    "agent": (_agent_widget, False),
+    "threat_score": (get_threat_score, False),
+    "incident_timeline": (get_incident_timeline, True),
+    "usage": (get_model_usage, True),
+    "threat_score_history": (get_risk_score_history, True),
+    "actions": (get_agent_actions, True),
+    "violation_categories": (get_violation_categories, True),
+    "autonomy_drift": (_autonomy_drift_widget, True),
+}
+
+@router.post("/bundle")
+async def get_dashboard_bundle(
+    bundle_in: DashboardBundleRequest,
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Runs several dashboard widgets for several agents in one request.
+    Each widget query gets its own pooled session so they run concurrently.
+    """
+    from app.db.models import Agent
+
+    unknown = [w for w in bundle_in.widgets if w not in BUNDLE_WIDGETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown widgets: {', '.join(unknown)}")
+
+    agent_ids = list(dict.fromkeys(bundle_in.agent_ids))
+    owned = (await db.execute(
+        select(Agent.id).where(Agent.id.in_(agent_ids), Agent.tenant_id == api_key.tenant_id)
+    )).scalars().all()
+    if len(owned) != len(agent_ids):
+        raise HTTPException(status_code=403, detail="Not authorized for one or more agents")
+
+    semaphore = asyncio.Semaphore(settings.BUNDLE_MAX_CONCURRENCY)
+    started = time.perf_counter()
+
+    async def run_widget(agent_id: int, widget: str):
+        handler, takes_period = BUNDLE_WIDGETS[widget]
+        kwargs = {"agentId": agent_id}
+        if takes_period and bundle_in.period:
+            kwargs["period"] = bundle_in.period
+        async with semaphore:
+            widget_started = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as session:
+                    data = await handler(db=session, **kwargs)
+                entry = {"data": data}
+            except Exception as e:
+                entry = {"error": str(e)}
+            entry["ms"] = round((time.perf_counter() - widget_started) * 1000, 2)
+        return agent_id, widget, entry
+
+    results = await asyncio.gather(*[
+        run_widget(agent_id, widget) for agent_id in agent_ids for widget in bundle_in.widgets
+    ])
+
+    agents = {agent_id: {} for agent_id in agent_ids}
+    for agent_id, widget, entry in results:
+        agents[agent_id][widget] = entry
+
+    return {
+        "agents": agents,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.db.models import APIKey
+from app.core.security import get_api_key
+from app.services.event_bus import event_bus
+import json
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+def _format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Server-sent events feed for the API key's tenant: new incidents, block/flag verdicts
+    and agent connect/disconnect changes. Slow consumers lose the oldest events first
+    and are told how many via a `dropped` event.
+    """
+    subscription = event_bus.subscribe(api_key.tenant_id)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                events, dropped = await subscription.next_batch(timeout=KEEPALIVE_SECONDS)
+                if dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'count': dropped})}\n\n"
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(_format_sse(event) for event in events)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+from app.db.models import APIKey
+from app.core.security import get_api_key
+from app.services.export import export_service, EXPORT_TABLES, FORMATS, pyarrow_available
+
+router = APIRouter()
+
+@router.get("/{table}")
+async def export_table(
+    table: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|parquet|arrow)$"),
+    agentId: Optional[int] = None,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Streams the tenant's `messages`, `incidents` or `tool_events` in [start, end) as
+    gzipped NDJSON, Parquet or an Arrow IPC stream.
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown export table: {table}")
+    if format != "ndjson" and not pyarrow_available():
+        raise HTTPException(status_code=400, detail="pyarrow is not installed; use format=ndjson")
+
+    media_type, extension = FORMATS[format]
+    filename = f"{table}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{extension}"
+    return StreamingResponse(
+        export_service.stream(table, format, api_key.tenant_id, start=start, end=end, agent_id=agentId),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
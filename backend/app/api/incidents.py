@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
+from datetime import datetime
 from app.db.events import get_db
 from app.db.models import Incident, Remediation
 from app.api.models import IncidentResponse, RemediationRequest
@@ -47,11 +48,25 @@ async def remediate_incident(
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
+    if remediation_in.false_positive:
+        remediation = Remediation(
+            incident_id=incident.id,
+            suggestion_text=remediation_in.suggestion_text or "Marked as false positive",
+            applied_by="system",
+            applied_at=datetime.utcnow(),
+            result="false_positive"
+        )
+        db.add(remediation)
+        incident.status = "false_positive"
+        await db.commit()
+        return {"status": "marked false positive"}
+
     # Apply remediation logic here (mocked)
     remediation = Remediation(
         incident_id=incident.id,
         suggestion_text=remediation_in.suggestion_text or "Auto-fix applied",
         applied_by="system",
+        applied_at=datetime.utcnow(),
         result="success"
     )
     db.add(remediation)
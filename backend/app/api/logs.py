@@ -1,15 +1,71 @@
-from fastapi import APIRouter
-from typing import List, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Optional
+from datetime import datetime
+from app.db.events import get_db
+from app.db.models import APIKey
+from app.core.security import get_api_key
+from app.services.search import search_service
+from app.services.log_pipeline import log_store
 
 router = APIRouter()
 
 @router.get("/")
-async def get_logs(agentId: int, limit: int = 100):
-    return [
-        {"timestamp": "2025-11-20T10:00:00Z", "level": "INFO", "message": "Agent started"},
-        {"timestamp": "2025-11-20T10:05:00Z", "level": "WARN", "message": "High latency detected"}
-    ]
+async def get_logs(
+    agentId: int,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[int] = None,
+    level: Optional[str] = None,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Recent engine log entries for an agent, newest first, served from the in-memory ring buffer.
+    Pass the smallest `seq` of a page as `before` to fetch the next one.
+    Only entries tagged with the API key's tenant are returned, so another tenant's agent reads as empty.
+    """
+    return log_store.tail(agentId, limit=limit, before=before, tenant_id=api_key.tenant_id, level=level)
 
 @router.get("/search")
-async def search_logs(query: str):
-    return [{"match": f"Found log for {query}"}]
+async def search_logs(
+    query: str = Query(..., min_length=1),
+    agentId: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    source: str = "all",
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Full-text search over monitored messages and incident transcripts.
+    Results are scoped to the API key's tenant and ranked by relevance.
+    """
+    if source == "all":
+        sources = search_service.SOURCES
+    elif source in search_service.SOURCES:
+        sources = (source,)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown source '{source}'")
+
+    try:
+        results = await search_service.search(
+            db,
+            query=query,
+            tenant_id=api_key.tenant_id,
+            agent_id=agentId,
+            since=since,
+            until=until,
+            sources=sources,
+            limit=limit,
+            offset=offset
+        )
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    return {
+        "query": query,
+        "limit": limit,
+        "offset": offset,
+        "results": results
+    }
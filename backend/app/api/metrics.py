@@ -1,38 +1,83 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
-from datetime import datetime, timedelta
-import random
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 from app.db.events import get_db
-from app.db.models import Metrics
+from app.db.models import APIKey, MetricsCounter
 from app.api.models import MetricsResponse
+from app.core.config import settings
 from app.core.security import get_api_key
+from app.engines.drift import drift_engine
+from app.services.metrics_job import COUNTER_FIELDS, metrics_from_counters
 
 router = APIRouter()
 
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # MetricsCounter dates are naive UTC; clients may send offsets or a trailing Z
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _bucket_start(date: datetime, bucket: str) -> datetime:
+    if bucket == "week":
+        return date - timedelta(days=date.weekday())
+    if bucket == "month":
+        return date.replace(day=1)
+    return date
+
 @router.get("/", response_model=List[MetricsResponse])
 async def get_metrics(
     tenant_id: int = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = Query("auto", pattern="^(auto|day|week|month)$"),
     db: AsyncSession = Depends(get_db),
-    api_key: str = Depends(get_api_key)
+    api_key: APIKey = Depends(get_api_key)
 ):
-    query = select(Metrics)
-    if tenant_id:
-        query = query.filter(Metrics.tenant_id == tenant_id)
-    
-    result = await db.execute(query)
-    return result.scalars().all()
+    """
+    Daily security metrics for the API key's tenant over [start, end), downsampled to
+    day/week/month buckets. Rates are re-derived from the summed counters of each bucket.
+    """
+    if tenant_id and tenant_id != api_key.tenant_id:
+        raise HTTPException(status_code=403, detail="Not authorized for this tenant")
+
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > timedelta(days=settings.METRICS_MAX_RANGE_DAYS):
+        raise HTTPException(status_code=400, detail=f"Range is limited to {settings.METRICS_MAX_RANGE_DAYS} days")
+    if bucket == "auto":
+        days = (end - start).days
+        bucket = "day" if days <= 31 else "week" if days <= 180 else "month"
+
+    result = await db.execute(
+        select(MetricsCounter).where(
+            MetricsCounter.tenant_id == api_key.tenant_id,
+            MetricsCounter.date >= start,
+            MetricsCounter.date < end
+        ).order_by(MetricsCounter.date)
+    )
+
+    buckets = {}
+    for row in result.scalars().all():
+        key = _bucket_start(row.date, bucket)
+        sums = buckets.setdefault(key, {f: 0 for f in COUNTER_FIELDS})
+        for field in COUNTER_FIELDS:
+            sums[field] += getattr(row, field) or 0
+
+    return [metrics_from_counters(api_key.tenant_id, date, sums) for date, sums in buckets.items()]
 
 @router.get("/autonomy-drift")
-async def get_autonomy_drift(agentId: int, time_range: str = Query("24h", alias="range")):
-    # Mock sparkline data
-    timestamps = [(datetime.utcnow() - timedelta(hours=i)).isoformat() for i in range(10)]
-    timestamps.reverse()
-    
-    return {
-        "timestamps": timestamps,
-        "drift_score": [random.uniform(0, 0.6) for _ in range(10)],
-        "current_status": "rising",
-        "confidence": 0.82
-    }
+async def get_autonomy_drift(
+    agentId: int,
+    time_range: str = Query("24h", alias="range"),
+    db: AsyncSession = Depends(get_db)
+):
+    hours = 24
+    if time_range == "7d": hours = 168
+    elif time_range == "12h": hours = 12
+
+    await drift_engine.ensure_loaded(db, [agentId])
+    return drift_engine.sparkline(agentId, hours=hours)
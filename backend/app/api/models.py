@@ -38,6 +38,19 @@ class CampaignResponse(BaseModel):
     campaign_id: int
     status: str
 
+class AttackPayload(BaseModel):
+    delivery_id: int
+    campaign_id: Optional[int] = None
+    payload: str
+    expires_at: datetime
+
+class AttackAnswer(BaseModel):
+    delivery_id: int
+    response: str
+
+class AttackAnswers(BaseModel):
+    responses: List[AttackAnswer]
+
 class IncidentResponse(BaseModel):
     id: int
     tenant_id: int
@@ -54,6 +67,7 @@ class IncidentResponse(BaseModel):
 class RemediationRequest(BaseModel):
     suggestion_text: Optional[str] = None
     apply: bool = True
+    false_positive: bool = False # close the incident as a false positive instead of remediating
 
 class WebhookEvent(BaseModel):
     agent_id: int
@@ -68,6 +82,11 @@ class PolicyUpload(BaseModel):
     policy_content: str # YAML or JSON string
     format: str = "yaml"
 
+class DashboardBundleRequest(BaseModel):
+    widgets: List[str]
+    agent_ids: List[int]
+    period: Optional[str] = None # passed to widgets that take one; each widget's default otherwise
+
 class MetricsResponse(BaseModel):
     tenant_id: int
     date: datetime
@@ -1,4 +1,5 @@
 
+from datetime import datetime
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.events import get_db
@@ -7,6 +8,12 @@ from app.api.models import MessageInput, MessageResponse
 from app.engines.sdk import sdk
 from app.services.policy_engine import policy_engine
 from app.core.security import get_api_key
+from app.services.log_pipeline import bind_log_context
+from app.services.threat_counter import threat_counter
+from app.core.cache import response_cache
+from app.services.event_bus import event_bus, presence
+from app.services.sketch_store import sketch_store
+from app.services.verdict_cache import verdict_cache
 from sqlalchemy.future import select
 
 router = APIRouter()
@@ -17,13 +24,17 @@ async def monitor_message(
     db: AsyncSession = Depends(get_db),
     api_key: APIKey = Depends(get_api_key)
 ):
+    # Incidents are timed from the message's arrival, so MTTD covers the evaluation below
+    received_at = datetime.utcnow()
+
     # Verify tenant
     if msg_in.tenant_id != api_key.tenant_id:
         # In a real scenario we might block this, but for now we trust the API key's tenant
         msg_in.tenant_id = api_key.tenant_id
 
+    bind_log_context(agent_id=msg_in.agent_id, tenant_id=msg_in.tenant_id)
+
     # Update agent last_seen (heartbeat)
-    from datetime import datetime
     from app.db.models import Agent
     from fastapi import HTTPException
     
@@ -34,13 +45,15 @@ async def monitor_message(
         raise HTTPException(status_code=404, detail=f"Agent with ID {msg_in.agent_id} not found. Please register the agent first.")
         
     agent.last_seen = datetime.utcnow()
+    await presence.touch(msg_in.tenant_id, agent.id)
     
     # Log message
     db_msg = Message(
         tenant_id=msg_in.tenant_id,
         agent_id=msg_in.agent_id,
         direction=msg_in.direction,
-        payload={"content": msg_in.content}
+        payload={"content": msg_in.content},
+        timestamp=received_at
     )
     db.add(db_msg)
     
@@ -61,6 +74,7 @@ async def monitor_message(
             severity="high",
             classification="policy_violation",
             transcript_ref=msg_in.content,
+            created_at=received_at,
             status="open"
         )
         db.add(incident)
@@ -70,6 +84,12 @@ async def monitor_message(
         
         await db.commit()
         await db.refresh(incident)
+        threat_counter.record(msg_in.agent_id, db_msg.decision)
+        if msg_in.direction == "in":
+            sketch_store.record_prompt(msg_in.agent_id, msg_in.content, db_msg.decision)
+        response_cache.invalidate(msg_in.agent_id)
+        event_bus.publish_incident(incident)
+        event_bus.publish_verdict(msg_in.tenant_id, msg_in.agent_id, "policy", db_msg.decision, incident.id)
         return MessageResponse(allowed=False, reason=policy_result["reason"], incident_id=incident.id)
 
     # 2. Engine Evaluation (PRE or OSE)
@@ -79,7 +99,9 @@ async def monitor_message(
     
     if msg_in.direction == "in":
         # User -> Agent: Check for Prompt Injection / Jailbreaks (PRE)
-        eval_result = sdk.evaluate_prompt(msg_in.content)
+        eval_result = await verdict_cache.evaluate(
+            msg_in.tenant_id, "pre", msg_in.content, lambda: sdk.evaluate_prompt(msg_in.content)
+        )
         
         if eval_result["risk_level"] != "low":
             allowed = False
@@ -93,20 +115,24 @@ async def monitor_message(
                 severity="critical" if eval_result["risk_level"] == "critical" else "high",
                 classification="jailbreak_attempt",
                 transcript_ref=msg_in.content,
+                created_at=received_at,
                 status="open"
             )
             db.add(incident)
+            # Set the verdict before committing so it is persisted with the incident
+            db_msg.decision = "block"
             await db.commit()
             await db.refresh(incident)
             incident_id = incident.id
-            
-            db_msg.decision = "block"
 
     else:
         # Agent -> User: Check for Harmful Content / PII (OSE)
         # We need the original prompt for context if available, but here we might only have the output
         # For now, we pass "Unknown Prompt" or maybe we should change the API to accept it
-        eval_result = sdk.evaluate_output(prompt="[Unknown Prompt]", output=msg_in.content)
+        eval_result = await verdict_cache.evaluate(
+            msg_in.tenant_id, "ose", msg_in.content,
+            lambda: sdk.evaluate_output(prompt="[Unknown Prompt]", output=msg_in.content)
+        )
         
         if eval_result["decision"] != "allow":
             allowed = False
@@ -118,17 +144,28 @@ async def monitor_message(
                 severity="high",
                 classification="unsafe_output",
                 transcript_ref=msg_in.content,
+                created_at=received_at,
                 status="open"
             )
             db.add(incident)
+            # Set the verdict before committing so it is persisted with the incident
+            db_msg.decision = "block"
             await db.commit()
             await db.refresh(incident)
             incident_id = incident.id
-            
-            db_msg.decision = "block"
 
     if allowed:
         db_msg.decision = "allow"
         await db.commit()
+    else:
+        # New incident: drop cached analytics for this agent and notify live dashboards
+        response_cache.invalidate(msg_in.agent_id)
+        event_bus.publish_incident(incident)
+        event_bus.publish_verdict(
+            msg_in.tenant_id, msg_in.agent_id, "pre" if msg_in.direction == "in" else "ose", db_msg.decision, incident_id
+        )
 
+    threat_counter.record(msg_in.agent_id, db_msg.decision)
+    if msg_in.direction == "in":
+        sketch_store.record_prompt(msg_in.agent_id, msg_in.content, db_msg.decision)
     return MessageResponse(allowed=allowed, reason=reason, incident_id=incident_id)
@@ -1,30 +1,228 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.events import get_db
-from app.db.models import Campaign
-from app.api.models import CampaignStart, CampaignResponse
+from sqlalchemy import func
+from sqlalchemy.future import select
+from typing import List, Optional
+import asyncio
+import json
+from app.db.events import get_db, AsyncSessionLocal
+from app.db.models import Agent, Campaign, Incident, APIKey
+from app.api.models import CampaignStart, CampaignResponse, AttackPayload, AttackAnswers
+from app.core.config import settings
 from app.core.security import get_api_key
-from app.services.redteam_runner import redteam_runner
+from app.services.campaign_queue import campaign_queue, FINISHED
+from app.services.redteam.mutators import MutatorChain
+from app.services.redteam.delivery import attack_inbox
+from app.services.event_bus import presence
 
 router = APIRouter()
 
 @router.post("/campaign", response_model=CampaignResponse)
 async def start_campaign(
     campaign_in: CampaignStart,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    api_key: str = Depends(get_api_key)
+    api_key: APIKey = Depends(get_api_key)
 ):
+    try:
+        for spec in campaign_in.mutators:
+            MutatorChain.parse(spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if campaign_in.agent_ids:
+        known = set((await db.execute(
+            select(Agent.id).where(Agent.id.in_(campaign_in.agent_ids), Agent.tenant_id == api_key.tenant_id)
+        )).scalars())
+        unknown = sorted(set(campaign_in.agent_ids) - known)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown agent(s): {unknown}")
+
+    # Queued durably; a campaign worker picks it up (see app/services/campaign_worker.py)
     campaign = Campaign(
-        tenant_id=campaign_in.tenant_id,
+        tenant_id=api_key.tenant_id,
         name="Red Team Campaign", # Could be dynamic
-        status="running",
-        config=campaign_in.model_dump()
+        status="queued",
+        config=campaign_in.model_dump(),
+        attempts=0
     )
     db.add(campaign)
     await db.commit()
     await db.refresh(campaign)
     
-    background_tasks.add_task(redteam_runner.run_campaign, campaign.id)
-    
-    return CampaignResponse(campaign_id=campaign.id, status="running")
+    return CampaignResponse(campaign_id=campaign.id, status=campaign.status)
+
+@router.get("/campaign/{campaign_id}")
+async def get_campaign(
+    campaign_id: int,
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    campaign = (await db.execute(
+        select(Campaign).where(Campaign.id == campaign_id, Campaign.tenant_id == api_key.tenant_id)
+    )).scalars().first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    # Results per agent, by severity (critical = vulnerability found, high = potential)
+    agents = {}
+    rows = await db.execute(
+        select(Incident.agent_id, Incident.severity, func.count(Incident.id))
+        .where(Incident.campaign_id == campaign_id)
+        .group_by(Incident.agent_id, Incident.severity)
+    )
+    for agent_id, severity, count in rows.all():
+        summary = agents.setdefault(agent_id, {"agent_id": agent_id, "attacks": 0, "critical": 0, "high": 0})
+        summary["attacks"] += count
+        if severity in ("critical", "high"):
+            summary[severity] += count
+
+    return {
+        "campaign_id": campaign.id,
+        "name": campaign.name,
+        "status": campaign.status,
+        "attempts": campaign.attempts,
+        "attacks_total": campaign.attacks_total,
+        "attacks_done": campaign.attacks_done or 0,
+        "stop_reason": campaign.stop_reason,
+        "findings": campaign.findings or {},
+        "started_at": campaign.started_at,
+        "finished_at": campaign.finished_at,
+        "agents": sorted(agents.values(), key=lambda a: a["agent_id"])
+    }
+
+@router.post("/campaign/{campaign_id}/cancel", response_model=CampaignResponse)
+async def cancel_campaign(
+    campaign_id: int,
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    status = await campaign_queue.cancel(db, campaign_id, api_key.tenant_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return CampaignResponse(campaign_id=campaign_id, status=status)
+
+STREAM_BATCH = 200
+
+def _progress(campaign: Campaign) -> dict:
+    return {
+        "status": campaign.status,
+        "attacks_total": campaign.attacks_total,
+        "attacks_done": campaign.attacks_done or 0
+    }
+
+@router.get("/campaign/{campaign_id}/stream")
+async def stream_campaign(
+    campaign_id: int,
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Server-sent events for one campaign: a `result` per persisted attack result (its id is the
+    incident id, so reconnecting with Last-Event-ID resumes), `progress` when the counters move,
+    and `end` once the campaign has finished and every result has been sent.
+    Polls the database, so it works whichever worker runs the campaign.
+    """
+    tenant_id = api_key.tenant_id
+    exists = (await db.execute(
+        select(Campaign.id).where(Campaign.id == campaign_id, Campaign.tenant_id == tenant_id)
+    )).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    async def event_stream():
+        cursor = last_event_id or 0
+        last_progress = None
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            # Fresh session per poll so a long stream doesn't hold a connection
+            async with AsyncSessionLocal() as session:
+                campaign = await session.get(Campaign, campaign_id)
+                incidents = (await session.execute(
+                    select(Incident)
+                    .where(Incident.campaign_id == campaign_id, Incident.id > cursor)
+                    .order_by(Incident.id)
+                    .limit(STREAM_BATCH)
+                )).scalars().all()
+
+            chunks = []
+            for incident in incidents:
+                cursor = incident.id
+                payload = {
+                    "id": incident.id,
+                    "agent_id": incident.agent_id,
+                    "attack_index": incident.attack_index,
+                    "severity": incident.severity,
+                    "classification": incident.classification,
+                    "status": incident.status,
+                    "transcript_ref": incident.transcript_ref,
+                    "created_at": incident.created_at
+                }
+                chunks.append(f"id: {incident.id}\nevent: result\ndata: {json.dumps(payload, default=str)}\n\n")
+
+            progress = _progress(campaign)
+            if progress != last_progress:
+                last_progress = progress
+                chunks.append(f"event: progress\ndata: {json.dumps(progress)}\n\n")
+            if chunks:
+                yield "".join(chunks)
+
+            if len(incidents) == STREAM_BATCH:
+                continue # more rows waiting
+            if campaign.status in FINISHED:
+                yield f"event: end\ndata: {json.dumps(progress)}\n\n"
+                return
+            if not chunks:
+                yield ": keepalive\n\n"
+            await asyncio.sleep(settings.REDTEAM_STREAM_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _tenant_agent(db: AsyncSession, agent_id: int, tenant_id: int) -> Agent:
+    agent = (await db.execute(
+        select(Agent).where(Agent.id == agent_id, Agent.tenant_id == tenant_id)
+    )).scalars().first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+@router.get("/agents/{agent_id}/attacks", response_model=List[AttackPayload])
+async def fetch_attacks(
+    agent_id: int,
+    limit: int = Query(10, ge=1, le=100, alias="max"),
+    wait: float = Query(20, ge=0),
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Long-poll for SDK-mode agents: returns up to `max` queued attack payloads, waiting up to
+    `wait` seconds (capped by REDTEAM_SDK_MAX_WAIT) for one to arrive. Post each response to
+    /agents/{agent_id}/attacks/responses; unanswered attacks are handed out again later.
+    """
+    await _tenant_agent(db, agent_id, api_key.tenant_id)
+    await db.close() # don't hold a connection for the length of the poll
+    await presence.touch(api_key.tenant_id, agent_id)
+    deliveries = await attack_inbox.fetch(agent_id, limit=limit, wait=wait)
+    return [
+        AttackPayload(delivery_id=d.id, campaign_id=d.campaign_id, payload=d.payload, expires_at=d.expires_at)
+        for d in deliveries
+    ]
+
+@router.post("/agents/{agent_id}/attacks/responses")
+async def answer_attacks(
+    agent_id: int,
+    answers: AttackAnswers,
+    db: AsyncSession = Depends(get_db),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """Stores the agent's responses; they are evaluated by the campaign run that sent the attacks."""
+    await _tenant_agent(db, agent_id, api_key.tenant_id)
+    accepted = await attack_inbox.answer(agent_id, {a.delivery_id: a.response for a in answers.responses})
+    return {"accepted": accepted, "rejected": [a.delivery_id for a in answers.responses if a.delivery_id not in accepted]}
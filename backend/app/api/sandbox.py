@@ -1,8 +1,20 @@
+import asyncio
+import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from app.core.config import settings
+from app.core.extractors import ExtractionError
 from app.engines.sandbox import sandbox
 
 router = APIRouter()
 
+def _upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
 @router.post("/process")
 async def process_file(
     file: UploadFile = File(...),
@@ -14,10 +26,21 @@ async def process_file(
     """
     if not file:
          raise HTTPException(status_code=400, detail="No file uploaded")
-         
+
+    # The multipart parser has already streamed the upload into a spooled temp file (kept in
+    # memory only while small); it is processed from there rather than read into memory.
+    # UploadLimitMiddleware stops oversized bodies while they stream in; this is the exact check
+    size = _upload_size(file)
+    if size > settings.SANDBOX_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File is {size} bytes; the sandbox accepts up to {settings.SANDBOX_MAX_UPLOAD_BYTES}"
+        )
+
     try:
-        content = await file.read()
-        result = sandbox.process_file_content(file.filename, content, instruction)
-        return result
+        # Scanning and the extraction call block; keep them off the event loop
+        return await asyncio.to_thread(sandbox.process_file_stream, file.filename, file.file, instruction)
+    except ExtractionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
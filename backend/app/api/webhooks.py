@@ -1,33 +1,17 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from app.db.events import get_db
-from app.db.models import Incident
-from app.api.models import WebhookEvent, WebhookResponse
-from app.core.security import get_api_key
-from app.engines.sdk import sdk
-
-router = APIRouter()
-
-@router.post("/agent_event", response_model=WebhookResponse)
-async def handle_agent_event(
-    event: WebhookEvent,
-    db: AsyncSession = Depends(get_db),
-    api_key: str = Depends(get_api_key)
-):
-    # Logic to check event type and payload
-    if event.event_type == "tool_call":
-        # Use AIM Engine to evaluate the tool call
-        action_data = {
-            "tool": event.payload.get("tool"),
-            "args": event.payload.get("args", "")
-        }
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.events import get_db
-from app.db.models import Incident, APIKey, ToolEvent
+from app.db.models import Agent, Incident, APIKey, ToolEvent
 from app.api.models import WebhookEvent, WebhookResponse
 from app.core.security import get_api_key
 from app.engines.sdk import sdk
+from app.services.log_pipeline import bind_log_context
+from app.core.cache import response_cache
+from app.engines.drift import drift_engine
+from app.services.event_bus import event_bus, presence
+from app.services.sketch_store import sketch_store
 
 router = APIRouter()
 
@@ -37,13 +21,17 @@ async def handle_agent_event(
     db: AsyncSession = Depends(get_db),
     api_key: APIKey = Depends(get_api_key)
 ):
+    # Incidents are timed from the event's arrival, so MTTD covers the AIM evaluation
+    received_at = datetime.utcnow()
+    bind_log_context(agent_id=event.agent_id, tenant_id=api_key.tenant_id)
+
     # Update agent last_seen (heartbeat)
-    from datetime import datetime
     agent_result = await db.execute(select(Agent).filter(Agent.id == event.agent_id))
     agent = agent_result.scalars().first()
     if agent:
         agent.last_seen = datetime.utcnow()
         await db.commit()
+        await presence.touch(api_key.tenant_id, agent.id)
     
     # Logic to check event type and payload
     if event.event_type == "tool_call":
@@ -61,10 +49,13 @@ async def handle_agent_event(
             agent_id=event.agent_id,
             tool_name=event.payload.get("tool"),
             tool_args=str(event.payload.get("args", "")),
-            allowed=(eval_result["decision"] == "allow")
+            allowed=(eval_result["decision"] == "allow"),
+            timestamp=received_at
         )
         db.add(tool_event)
         await db.commit()
+        drift_engine.record(event.agent_id, tool_event.tool_name, agent.allowed_tools if agent else None)
+        sketch_store.record_tool_call(event.agent_id, tool_event.tool_name, event.payload.get("args", ""))
         
         if eval_result["decision"] != "allow":
             # Create Incident
@@ -74,15 +65,19 @@ async def handle_agent_event(
                 severity="critical",
                 classification="unsafe_tool_use",
                 transcript_ref=f"Tool: {event.payload.get('tool')} | Args: {event.payload.get('args')} | Reason: {eval_result.get('reason', 'N/A')}",
+                created_at=received_at,
                 status="open"
             )
             db.add(incident)
             await db.commit()
+            response_cache.invalidate(event.agent_id)
+            event_bus.publish_incident(incident)
+            event_bus.publish_verdict(api_key.tenant_id, event.agent_id, "aim", eval_result["decision"], incident.id)
             
             # Send Alert
             from app.services.notifications import notification_service
             await notification_service.alert_incident(incident)
             
-            return WebhookResponse(status="blocked", incident_id=incident.id)
+            return WebhookResponse(allowed=False, reason=f"Blocked by AIM: incident {incident.id}")
     
     return WebhookResponse(allowed=True)
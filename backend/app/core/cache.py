@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+from app.core.config import settings
+
+
+class ResponseCache:
+    """
+    Short-TTL cache for read endpoints.
+    Concurrent misses for the same key share one computation, and entries can be
+    invalidated per agent when new incidents are written.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (expires_at, value, agent_id)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._by_agent: Dict[Any, Set[Hashable]] = {}
+        # Bumped on invalidation so results computed from pre-invalidation data aren't stored
+        self._generation: Dict[Any, int] = {}
+
+    def _get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, agent_id = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_agent.get(entry[2])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_agent[entry[2]]
+
+    def _store(self, key: Hashable, value: Any, ttl: float, agent_id: Any):
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, agent_id)
+        self._by_agent.setdefault(agent_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    async def get_or_compute(self, key: Hashable, ttl: float, compute: Callable[[], Awaitable[Any]], agent_id: Any = None):
+        entry = self._get(key)
+        if entry is not None:
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The leading request went away; take over the computation
+                return await self.get_or_compute(key, ttl, compute, agent_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation.get(agent_id, 0)
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so asyncio doesn't warn when there are none
+            future.exception()
+            raise
+        else:
+            if self._generation.get(agent_id, 0) == generation:
+                self._store(key, value, ttl, agent_id)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, agent_id: Any):
+        """Drops every cached response computed for an agent."""
+        self._generation[agent_id] = self._generation.get(agent_id, 0) + 1
+        for key in list(self._by_agent.get(agent_id, ())):
+            self._drop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_agent.clear()
+        self._generation.clear()
+
+
+response_cache = ResponseCache(max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def cached(endpoint: str, ttl: float):
+    """
+    Caches an endpoint's response keyed by endpoint, agent and period. The key is not
+    tenant-scoped: only use it on endpoints whose response depends on nothing else
+    (an agent belongs to exactly one tenant), and do any tenant check before the cache.
+    Place it under the router decorator; FastAPI still sees the wrapped signature.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            agent_id = kwargs.get("agentId")
+            key = (endpoint, agent_id, kwargs.get("period"))
+            return await response_cache.get_or_compute(key, ttl, lambda: func(*args, **kwargs), agent_id=agent_id)
+        return wrapper
+    return decorator
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AI Sentinel"
@@ -16,6 +16,10 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_SECRET: str = ""
     
     GEMINI_API_KEY: str = ""
+    # "gemini", or "stub" for canned offline answers (benchmarks and local development; see engines/llm_stub.py)
+    LLM_PROVIDER: str = "gemini"
+    LLM_STUB_LATENCY_MS: float = 50 # median simulated generation time
+    LLM_STUB_COMPLY_RATE: float = 0.2 # share of simulated targets' replies that comply with the attack
     
     # Notification Settings
     SMTP_SERVER: str = "smtp.gmail.com"
@@ -24,6 +28,79 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = ""
     SLACK_WEBHOOK_URL: str = ""
 
+    # Structured engine logs
+    LOG_BUFFER_SIZE: int = 1000 # entries kept in memory per agent
+    LOG_MAX_AGENTS: int = 10000 # agents with an in-memory buffer before LRU eviction
+    LOG_STORE_DIR: str = "./logs"
+    LOG_FLUSH_INTERVAL: float = 2.0 # seconds
+
+    # Analytics
+    THREAT_COUNTER_RESYNC_SECONDS: float = 300 # reload in-memory threat windows from the DB
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    DRIFT_RESYNC_SECONDS: float = 600 # reload in-memory tool histories from the DB
+    METRICS_JOB_INTERVAL: float = 300 # seconds between incremental Metrics roll-ups
+    METRICS_MAX_RANGE_DAYS: int = 730 # widest [start, end) span /metrics will serve
+    BUNDLE_MAX_CONCURRENCY: int = 8 # widget queries in flight per /analytics/bundle request
+    SKETCH_FLUSH_INTERVAL: float = 30 # seconds between writes of this worker's sketch windows
+    SKETCH_SYNC_SECONDS: float = 60 # reload other workers' sketch windows after this long
+    SKETCH_RETENTION_HOURS: int = 168
+
+    # Ingest rate limits (token buckets per minute) for /v1/monitor and /v1/webhook, by Tenant.plan
+    RATE_LIMIT_PLANS: Dict[str, Dict[str, int]] = {
+        "free": {"tenant": 600, "agent": 120},
+        "pro": {"tenant": 6000, "agent": 1200},
+        "enterprise": {"tenant": 60000, "agent": 12000},
+    }
+
+    # Shared state for rate limits, verdict cache and presence:
+    # memory:// (per process), sqlite:///./state.db (all workers on a node), redis://host:6379/0 (all nodes)
+    STATE_BACKEND_URL: str = "memory://"
+    STATE_MEMORY_MAX_KEYS: int = 100000 # keys/buckets kept by the memory backend before LRU eviction
+    VERDICT_CACHE_TTL: float = 300 # seconds a PRE/OSE verdict is reused for identical content
+
+    # Red-team campaign execution
+    REDTEAM_LLM_CONCURRENCY: int = 16 # attack generations / simulated probes in flight
+    REDTEAM_EVAL_CONCURRENCY: int = 16 # OSE evaluations in flight
+    REDTEAM_TARGET_CONCURRENCY: int = 8 # probes in flight per target (overridable in target_config)
+    REDTEAM_AGENT_CONCURRENCY: int = 4 # probes in flight per agent (overridable as target_config.agent_concurrency)
+    REDTEAM_TARGET_RPS: float = 10 # probes per second per target (overridable as target_config.rate_limit_rps)
+    REDTEAM_PROBE_TIMEOUT: float = 10
+    REDTEAM_MAX_IN_FLIGHT: int = 64 # attacks started but not finished, per campaign
+    REDTEAM_RESULT_BATCH: int = 50 # attack results persisted per commit
+    REDTEAM_RESULT_FLUSH_SECONDS: float = 2 # ... or sooner, once results are this old
+    REDTEAM_STREAM_POLL_SECONDS: float = 1
+    REDTEAM_SDK_RESPONSE_TIMEOUT: float = 300 # seconds an SDK-mode agent has to answer an attack
+    REDTEAM_SDK_VISIBILITY_SECONDS: float = 60 # fetched but unanswered attacks are handed out again after this
+    REDTEAM_SDK_MAX_WAIT: float = 30 # longest long-poll for attacks
+
+    # Campaign job queue
+    CAMPAIGN_WORKER_EMBEDDED: bool = True # run a queue worker inside the API process; set False when running separate workers
+    CAMPAIGN_WORKER_SLOTS: int = 4 # campaigns a worker runs at once
+    CAMPAIGN_POLL_SECONDS: float = 2
+    CAMPAIGN_LEASE_SECONDS: float = 60 # renewed every third of this while a campaign runs
+    CAMPAIGN_MAX_ATTEMPTS: int = 3 # claims (including after crashes) before a campaign is failed
+    CAMPAIGN_PLAN_CONCURRENCY: Dict[str, int] = {"free": 1, "pro": 3, "enterprise": 10} # running campaigns per tenant
+
+    # Secure sandbox uploads
+    SANDBOX_MAX_UPLOAD_BYTES: int = 50 * 1024 * 1024
+    SANDBOX_CHUNK_BYTES: int = 1024 * 1024 # decoded and scanned at a time
+    SANDBOX_LLM_MAX_CHARS: int = 200000 # document text sent to the extraction model
+    SANDBOX_LLM_CHUNK_TOKENS: int = 8000 # per extraction call; longer documents are split and the results merged
+    SANDBOX_LLM_CONCURRENCY: int = 4 # chunk extractions in flight, across all uploads
+    SANDBOX_CHUNK_CACHE_ENTRIES: int = 4096 # chunk results remembered by content hash
+    SANDBOX_CACHE_PATH: str = "./sandbox_cache.db" # results of identical uploads, shared by the node's workers; "" disables
+    SANDBOX_CACHE_TTL: float = 86400
+    SANDBOX_CACHE_MAX_ENTRIES: int = 10000
+    SANDBOX_EXTRACT_WORKERS: int = 2 # processes parsing PDFs and images
+    SANDBOX_EXTRACT_TIMEOUT: float = 30 # seconds per file
+    SANDBOX_EXTRACT_MEMORY_MB: int = 512 # per extraction process
+    SANDBOX_PDF_PAGES_PER_TASK: int = 20 # larger PDFs are parsed in parallel page ranges of this size
+    SANDBOX_EXTRACT_MAX_CHARS: int = 2000000 # text kept from one PDF or image
+
+    # Live event feed
+    EVENT_STREAM_BUFFER: int = 256 # events buffered per subscriber before dropping the oldest
+    PRESENCE_TIMEOUT_SECONDS: float = 60 # agent counts as disconnected after this long without a heartbeat
+
     class Config:
         env_file = ".env"
         extra = "ignore"
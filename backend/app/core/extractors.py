@@ -0,0 +1,273 @@
+import io
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_EXCEPTION
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+from app.core.config import settings
+
+logger = logging.getLogger("Veridian.Sandbox")
+
+IMAGE_MAGIC = {
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpeg",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+    b"BM": "bmp",
+    b"II*\x00": "tiff",
+    b"MM\x00*": "tiff",
+}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+# EXIF tags that carry free text (and so can carry instructions)
+EXIF_TEXT_TAGS = {270: "ImageDescription", 305: "Software", 315: "Artist", 33432: "Copyright",
+                  37510: "UserComment", 40092: "XPComment", 40095: "XPSubject"}
+INLINE_BYTES = 1024 * 1024 # smaller files are sent to the workers as bytes instead of through a temp file
+
+Source = Union[bytes, str] # file content, or the path of a temp copy
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def detect_format(filename: str, head: bytes) -> str:
+    """"pdf", "image" or "text", from the leading bytes first and the extension second."""
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    if any(head.startswith(magic) for magic in IMAGE_MAGIC) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"):
+        return "image"
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".pdf":
+        return "pdf"
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    return "text"
+
+
+# Worker side. These run in the pool's processes, so they import nothing from the app beyond this module.
+
+def _init_worker(memory_bytes: int):
+    try:
+        import resource
+        # Address-space cap on top of what the fresh interpreter already uses
+        with open("/proc/self/statm") as f:
+            in_use = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        resource.setrlimit(resource.RLIMIT_AS, (in_use + memory_bytes, resource.RLIM_INFINITY))
+    except (ImportError, OSError, ValueError):
+        pass # not enforceable on this platform; the per-file time limit still applies
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError("extraction time limit exceeded")
+
+
+def _with_time_limit(seconds: float, fn, *args):
+    # The timer interrupts the parse inside the worker, so an overrun frees the process for the next file
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, max(seconds, 0.01))
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _open(source: Source):
+    return io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+
+
+def _pdf_pages(source: Source, start: int, stop: int, max_chars: int) -> Tuple[int, List[str]]:
+    from pypdf import PdfReader
+    with _open(source) as f:
+        reader = PdfReader(f)
+        count = len(reader.pages)
+        texts = []
+        for number in range(start, min(stop, count)):
+            texts.append((reader.pages[number].extract_text() or "")[:max_chars])
+        return count, texts
+
+
+def extract_pdf_pages(source: Source, start: int, stop: int, max_chars: int, seconds: float) -> Tuple[int, List[str]]:
+    """(page count, text of pages [start, stop)), each page cut to max_chars."""
+    return _with_time_limit(seconds, _pdf_pages, source, start, stop, max_chars)
+
+
+def _image(source: Source) -> Dict:
+    from PIL import Image
+    with _open(source) as f, Image.open(f) as image:
+        # Header and metadata only; pixels are never decoded
+        metadata = {"format": image.format, "width": image.width, "height": image.height, "mode": image.mode,
+                    "frames": getattr(image, "n_frames", 1)}
+        text = {}
+        for key, value in image.info.items():
+            if isinstance(value, str):
+                text[str(key)] = value
+        exif = image.getexif()
+        for tag, name in EXIF_TEXT_TAGS.items():
+            value = exif.get(tag)
+            if isinstance(value, bytes):
+                # UserComment has an 8-byte charset prefix; XP* tags are UTF-16
+                value = value.decode("utf-16-le" if name.startswith("XP") else "utf-8", errors="ignore").strip("\x00")
+                if name == "UserComment":
+                    value = value[8:] if value[:8].rstrip("\x00").isalpha() else value
+            if value:
+                text[name] = str(value)
+        metadata["text_fields"] = text
+        return metadata
+
+
+def extract_image(source: Source, seconds: float) -> Dict:
+    """Format, size and the free-text metadata fields of an image."""
+    return _with_time_limit(seconds, _image, source)
+
+
+# API side
+
+@dataclass
+class Extraction:
+    format: str
+    text: str = ""
+    pages: Optional[int] = None
+    metadata: Dict = field(default_factory=dict)
+    truncated: bool = False
+
+
+class DocumentExtractor:
+    """
+    Format-aware text extraction for sandbox uploads, run in a process pool so PDF and image
+    parsing doesn't hold the API worker's GIL. Large PDFs are split into page ranges parsed in
+    parallel. Each file gets a time limit (enforced inside the worker as well as here) and each
+    worker an address-space limit; a worker killed by either is replaced with a fresh pool.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 30, memory_mb: int = 512,
+                 pages_per_task: int = 20, max_chars: int = 2000000):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.pages_per_task = pages_per_task
+        self.max_chars = max_chars
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Forking a process with running threads and an event loop is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker, initargs=(self.memory_mb * 1024 * 1024,)
+                )
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor):
+        logger.warning("Extraction pool broken; starting a new one")
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _wait(self, pool: ProcessPoolExecutor, futures: list, deadline: float) -> list:
+        try:
+            done, pending = wait(futures, timeout=max(0, deadline - time.monotonic()) + 1, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+            if pending:
+                raise FutureTimeout()
+            return [future.result() for future in futures]
+        except (FutureTimeout, TimeoutError):
+            for future in futures:
+                future.cancel()
+            raise ExtractionError(f"Extraction exceeded the {self.timeout:g}s time limit")
+        except MemoryError:
+            raise ExtractionError(f"Extraction exceeded the {self.memory_mb} MB memory limit")
+        except BrokenProcessPool:
+            self._reset_pool(pool)
+            raise ExtractionError("Extraction worker crashed (memory limit or malformed file)")
+
+    def _pdf(self, pool: ProcessPoolExecutor, source: Source, deadline: float) -> Extraction:
+        step = self.pages_per_task
+
+        def remaining() -> float:
+            return deadline - time.monotonic()
+
+        # The first range also reports the page count; the rest are parsed in parallel
+        count, texts = self._wait(pool, [pool.submit(extract_pdf_pages, source, 0, step, self.max_chars, remaining())], deadline)[0]
+        ranges = [pool.submit(extract_pdf_pages, source, start, start + step, self.max_chars, remaining())
+                  for start in range(step, count, step)]
+        for _, more in self._wait(pool, ranges, deadline):
+            texts.extend(more)
+
+        parts, length, truncated = [], 0, False
+        for number, text in enumerate(texts, 1):
+            part = f"[Page {number}]\n{text}\n"
+            if length + len(part) > self.max_chars:
+                parts.append(part[:self.max_chars - length])
+                truncated = True
+                break
+            parts.append(part)
+            length += len(part)
+        return Extraction(format="pdf", text="".join(parts), pages=count, truncated=truncated)
+
+    def _image(self, pool: ProcessPoolExecutor, source: Source, deadline: float) -> Extraction:
+        metadata = self._wait(pool, [pool.submit(extract_image, source, deadline - time.monotonic())], deadline)[0]
+        text = "\n".join(f"{key}: {value}" for key, value in metadata["text_fields"].items())
+        return Extraction(format="image", text=text[:self.max_chars], metadata=metadata, truncated=len(text) > self.max_chars)
+
+    def extract(self, filename: str, buffer) -> Extraction:
+        """
+        Text of a PDF or image upload. `buffer` is bytes or a memory-mapped file. Plain text comes
+        back as an Extraction with format "text" and no text: the caller streams it itself.
+        """
+        fmt = detect_format(filename, bytes(buffer[:16]))
+        if fmt == "text":
+            return Extraction(format="text")
+
+        deadline = time.monotonic() + self.timeout
+        path = None
+        try:
+            if len(buffer) <= INLINE_BYTES:
+                source: Source = bytes(buffer)
+            else:
+                # Workers read large files from disk rather than each getting a pickled copy
+                with tempfile.NamedTemporaryFile(prefix="sandbox-", suffix=os.path.splitext(filename or "")[1], delete=False) as f:
+                    path = f.name
+                    for start in range(0, len(buffer), INLINE_BYTES):
+                        f.write(buffer[start:start + INLINE_BYTES])
+                source = path
+            pool = self._get_pool()
+            try:
+                return self._pdf(pool, source, deadline) if fmt == "pdf" else self._image(pool, source, deadline)
+            except ExtractionError:
+                raise
+            except BrokenProcessPool:
+                self._reset_pool(pool)
+                raise ExtractionError("Extraction worker crashed (memory limit or malformed file)")
+            except Exception as e:
+                raise ExtractionError(f"Could not read {fmt.upper()} file: {e}") from e
+        finally:
+            if path:
+                os.unlink(path)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            # Running parses end within their time limit
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+document_extractor = DocumentExtractor(
+    workers=settings.SANDBOX_EXTRACT_WORKERS,
+    timeout=settings.SANDBOX_EXTRACT_TIMEOUT,
+    memory_mb=settings.SANDBOX_EXTRACT_MEMORY_MB,
+    pages_per_task=settings.SANDBOX_PDF_PAGES_PER_TASK,
+    max_chars=settings.SANDBOX_EXTRACT_MAX_CHARS
+)
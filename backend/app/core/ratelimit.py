@@ -1,23 +1,159 @@
-from fastapi import Request, HTTPException
-from collections import defaultdict
+from fastapi import HTTPException
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import math
+import logging
 import time
+from app.core.config import settings
+from app.core.state import state, StateBackend, RateLimitResult
+
+logger = logging.getLogger("Veridian.RateLimit")
+
 
 class RateLimiter:
-    def __init__(self):
-        self.requests = defaultdict(list)
-        self.limit = 100 # requests
-        self.window = 60 # seconds
+    """
+    Token-bucket style limits over the configured state backend (see app.core.state):
+    per-process with the memory backend, shared across workers with SQLite or Redis.
+    """
+
+    def __init__(self, backend: StateBackend = state, limit: int = 100, window: float = 60):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+
+    async def hit(self, key: str, limit: Optional[int] = None, window: Optional[float] = None, cost: int = 1) -> RateLimitResult:
+        return await self.backend.rate_limit(key, limit or self.limit, window or self.window, cost)
+
+    async def hit_many(self, checks: List[Tuple[str, Optional[int]]], window: Optional[float] = None, cost: int = 1) -> List[RateLimitResult]:
+        """Hits several (key, limit) buckets; a request rejected by any of them is charged to none."""
+        return await self.backend.rate_limit_many(
+            [(key, limit or self.limit) for key, limit in checks], window or self.window, cost
+        )
 
     async def check(self, key: str):
-        now = time.time()
-        reqs = self.requests[key]
-        
-        # Clean old requests
-        self.requests[key] = [t for t in reqs if t > now - self.window]
-        
-        if len(self.requests[key]) >= self.limit:
+        if not (await self.hit(key)).allowed:
             raise HTTPException(status_code=429, detail="Rate limit exceeded")
-        
-        self.requests[key].append(now)
+
 
 rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """
+    Per-tenant and per-agent limits for the ingest endpoints, scaled by Tenant.plan.
+    Every response on a limited path carries X-RateLimit-* headers for the tighter of
+    the two buckets; rejected requests get 429 with Retry-After.
+    Requests without a valid API key pass through so the endpoint can reject them.
+    """
+
+    PATHS = ("/v1/monitor", "/v1/webhook")
+    PLAN_CACHE_SECONDS = 60
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+        self._plans: "OrderedDict[str, Tuple[float, Optional[Tuple[int, str]]]]" = OrderedDict()
+
+    async def _tenant_plan(self, raw_key: str) -> Optional[Tuple[int, str]]:
+        key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+        cached = self._plans.get(key_hash)
+        if cached is not None and time.monotonic() - cached[0] < self.PLAN_CACHE_SECONDS:
+            return cached[1]
+
+        from sqlalchemy.future import select
+        from app.db.events import AsyncSessionLocal
+        from app.db.models import APIKey, Tenant
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(APIKey.tenant_id, Tenant.plan)
+                .join(Tenant, Tenant.id == APIKey.tenant_id)
+                .where(APIKey.key_hash == key_hash, APIKey.is_active == True)
+            )).first()
+        value = (row[0], row[1] or "free") if row else None
+
+        self._plans[key_hash] = (time.monotonic(), value)
+        self._plans.move_to_end(key_hash)
+        while len(self._plans) > 10000:
+            self._plans.popitem(last=False)
+        return value
+
+    @staticmethod
+    def _agent_id(body: bytes) -> Optional[int]:
+        try:
+            agent_id = json.loads(body).get("agent_id")
+        except (ValueError, AttributeError):
+            return None
+        return agent_id if isinstance(agent_id, int) else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.PATHS):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        raw_key = headers.get(b"x-api-key")
+        tenant = await self._tenant_plan(raw_key.decode("latin-1")) if raw_key else None
+        if tenant is None:
+            return await self.app(scope, receive, send)
+        tenant_id, plan = tenant
+        limits = settings.RATE_LIMIT_PLANS.get(plan) or settings.RATE_LIMIT_PLANS["free"]
+
+        # Buffer the (small) JSON body to find the agent, then replay it to the app
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        checks = [(f"tenant:{tenant_id}", limits["tenant"])]
+        agent_id = self._agent_id(body)
+        if agent_id is not None:
+            checks.append((f"agent:{tenant_id}:{agent_id}", limits["agent"]))
+
+        try:
+            results = await self.limiter.hit_many(checks)
+        except Exception as e:
+            # Fail open: an unreachable state backend shouldn't take ingest down with it
+            logger.warning(f"Rate limit check failed: {e}")
+            return await self.app(scope, replay, send)
+        # Report whichever bucket is closest to empty
+        tightest = min(results, key=lambda r: r.remaining)
+        rate_headers = [
+            (b"x-ratelimit-limit", str(tightest.limit).encode()),
+            (b"x-ratelimit-remaining", str(tightest.remaining).encode()),
+            (b"x-ratelimit-reset", str(math.ceil(tightest.reset)).encode()),
+        ]
+
+        if not all(r.allowed for r in results):
+            retry_after = max(r.retry_after for r in results if not r.allowed)
+            payload = json.dumps({"detail": "Rate limit exceeded"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": rate_headers + [
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": payload})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + rate_headers
+            await send(message)
+
+        await self.app(scope, replay, send_with_headers)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger("Veridian.Sandbox")
+
+
+def content_digest(buffer, chunk_bytes: int = 1024 * 1024) -> str:
+    """SHA-256 of bytes or a memory-mapped file, hashed a chunk at a time."""
+    digest = hashlib.sha256()
+    for start in range(0, len(buffer), chunk_bytes):
+        digest.update(buffer[start:start + chunk_bytes])
+    return digest.hexdigest()
+
+
+class SandboxResultCache:
+    """
+    Sandbox results keyed by (content SHA-256, instruction, engine version), in a local SQLite
+    file in WAL mode so every worker on the node shares it. Entries expire after `ttl` seconds,
+    and past `max_entries` the least recently used are dropped (swept every PRUNE_EVERY stores,
+    so the table overshoots by at most that many). Calls are blocking; the sandbox
+    runs them off the event loop. An empty path disables the cache.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, result TEXT, created_at REAL, used_at REAL, expires_at REAL, hits INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS ix_results_used_at ON results (used_at);
+    """
+    PRUNE_EVERY = 64 # stores between size/expiry sweeps
+
+    def __init__(self, path: str, ttl: float = 86400, max_entries: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._stores = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.ttl > 0 and self.max_entries > 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(digest: str, instruction: str, engine_version: str) -> str:
+        return hashlib.sha256(f"{digest}\0{instruction}\0{engine_version}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(result, cache metadata) for a live entry, else None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT result, created_at, expires_at, hits FROM results WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Sandbox cache read failed: {e}")
+            return None
+        result, created_at, expires_at, hits = row
+        return json.loads(result), {
+            "age_seconds": round(now - created_at, 1), "expires_in_seconds": round(expires_at - now, 1), "hits": hits + 1
+        }
+
+    def put(self, key: str, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, created_at, used_at, expires_at, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                (key, json.dumps(result), now, now, now + self.ttl)
+            )
+            self._stores += 1
+            if self._stores % self.PRUNE_EVERY == 1:
+                self.prune(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Sandbox cache write failed: {e}")
+
+    def prune(self, conn: Optional[sqlite3.Connection] = None):
+        conn = conn or self._conn()
+        conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+
+sandbox_cache = SandboxResultCache(
+    settings.SANDBOX_CACHE_PATH, ttl=settings.SANDBOX_CACHE_TTL, max_entries=settings.SANDBOX_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,498 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlparse, unquote
+from app.core.config import settings
+
+logger = logging.getLogger("Veridian.State")
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float # seconds until the limit is fully available again
+    retry_after: float # seconds until a rejected request would be allowed
+
+
+class StateBackendError(Exception):
+    pass
+
+
+def _take_tokens(tokens: Optional[float], updated_at: float, now: float, limit: int, window: float, cost: float) -> Tuple[float, RateLimitResult]:
+    """Token-bucket step shared by the memory and SQLite backends. Returns (tokens left, result)."""
+    rate = limit / window
+    tokens = float(limit) if tokens is None else min(limit, tokens + (now - updated_at) * rate)
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    retry_after = 0.0 if allowed else (cost - tokens) / rate
+    return tokens, RateLimitResult(allowed, limit, int(tokens), (limit - tokens) / rate, retry_after)
+
+
+def _take_all(buckets: Sequence[Tuple[Optional[float], float, int]], now: float, window: float, cost: float) -> List[Tuple[float, RateLimitResult]]:
+    """_take_tokens over several (tokens, updated_at, limit) buckets, charging none unless all have room."""
+    taken = [_take_tokens(tokens, updated_at, now, limit, window, cost) for tokens, updated_at, limit in buckets]
+    if all(result.allowed for _, result in taken):
+        return taken
+    # Refill without charging; buckets that had room still report as allowed
+    return [step if not step[1].allowed else _take_tokens(tokens, updated_at, now, limit, window, 0)
+            for step, (tokens, updated_at, limit) in zip(taken, buckets)]
+
+
+class StateBackend:
+    """
+    Small key-value, rate-limit and event-log interface for state that must agree across workers.
+    Values are strings; ttl is in seconds.
+    """
+
+    shared = False # True when other processes see the same state
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        """Stores a value; with nx=True only if the key is absent. Returns whether it was stored."""
+        raise NotImplementedError
+
+    async def expire(self, key: str, ttl: float) -> bool:
+        """Resets a live key's TTL. Returns False if the key doesn't exist."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def rate_limit(self, key: str, limit: int, window: float = 60, cost: int = 1) -> RateLimitResult:
+        return (await self.rate_limit_many([(key, limit)], window, cost))[0]
+
+    async def rate_limit_many(self, checks: Sequence[Tuple[str, int]], window: float = 60, cost: int = 1) -> List[RateLimitResult]:
+        """Checks several (key, limit) buckets at once; the cost is taken from all of them or from none."""
+        raise NotImplementedError
+
+    async def append_event(self, channel: str, data: str) -> str:
+        """Appends to a short-lived ordered log; returns the entry id."""
+        raise NotImplementedError
+
+    async def read_events(self, channel: str, after: Optional[str]) -> List[Tuple[str, str]]:
+        """Entries appended after `after` (from the start of the log when None), oldest first."""
+        raise NotImplementedError
+
+    async def last_event_id(self, channel: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Per-process state. Right for a single worker; each worker gets its own copy otherwise."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._values: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict() # key -> (value, expires_at)
+        self._buckets: "OrderedDict[str, list]" = OrderedDict() # key -> [tokens, updated_at]
+        self._events: Dict[str, list] = {}
+        self._event_ids = 0
+
+    def _live(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        if nx and self._live(key) is not None:
+            return False
+        self._values[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_keys:
+            self._values.popitem(last=False)
+        return True
+
+    async def expire(self, key: str, ttl: float) -> bool:
+        entry = self._live(key)
+        if entry is None:
+            return False
+        self._values[key] = (entry[0], time.monotonic() + ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    def _bucket(self, key: str, now: float) -> list:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [None, now]
+            # An idle bucket refills to full, so evicting the least recently used loses nothing
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    async def rate_limit_many(self, checks: Sequence[Tuple[str, int]], window: float = 60, cost: int = 1) -> List[RateLimitResult]:
+        now = time.monotonic()
+        buckets = [self._bucket(key, now) for key, _ in checks]
+        steps = _take_all([(bucket[0], bucket[1], limit) for bucket, (_, limit) in zip(buckets, checks)], now, window, cost)
+        for bucket, (tokens, _) in zip(buckets, steps):
+            bucket[0], bucket[1] = tokens, now
+        return [result for _, result in steps]
+
+    async def append_event(self, channel: str, data: str) -> str:
+        self._event_ids += 1
+        log = self._events.setdefault(channel, [])
+        log.append((self._event_ids, data))
+        del log[:-1000]
+        return str(self._event_ids)
+
+    async def read_events(self, channel: str, after: Optional[str]) -> List[Tuple[str, str]]:
+        after_id = int(after) if after else 0
+        return [(str(i), data) for i, data in self._events.get(channel, []) if i > after_id]
+
+    async def last_event_id(self, channel: str) -> Optional[str]:
+        log = self._events.get(channel)
+        return str(log[-1][0]) if log else None
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    State in a local SQLite file in WAL mode, shared by every worker on the node.
+    Calls run in the default thread pool with one connection per thread; read-modify-write
+    operations take the write lock up front (BEGIN IMMEDIATE) so they are atomic across processes.
+    """
+
+    shared = True
+    EVENT_RETENTION_SECONDS = 300
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL);
+        CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL);
+        CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT, data TEXT, created_at REAL);
+        CREATE INDEX IF NOT EXISTS ix_events_channel ON events (channel, id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._ops = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._call, fn, *args)
+
+    def _call(self, fn, *args):
+        conn = self._conn()
+        self._ops += 1
+        if self._ops % 1000 == 0:
+            self._vacuum(conn)
+        return fn(conn, *args)
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, fn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _vacuum(self, conn: sqlite3.Connection):
+        now = time.time()
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - 3600,))
+        conn.execute("DELETE FROM events WHERE created_at < ?", (now - self.EVENT_RETENTION_SECONDS,))
+
+    @staticmethod
+    def _get(conn, key):
+        row = conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[str]]:
+        def run(conn):
+            return [self._get(conn, key) for key in keys]
+        return await self._run(run)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        def run(conn):
+            def write():
+                if nx and self._get(conn, key) is not None:
+                    return False
+                expires_at = time.time() + ttl if ttl else None
+                conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+                return True
+            return self._write(conn, write)
+        return await self._run(run)
+
+    async def expire(self, key: str, ttl: float) -> bool:
+        def run(conn):
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE kv SET expires_at = ? WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (now + ttl, key, now)
+            )
+            return cursor.rowcount == 1
+        return await self._run(run)
+
+    async def delete(self, key: str):
+        await self._run(lambda conn: conn.execute("DELETE FROM kv WHERE key = ?", (key,)))
+
+    async def rate_limit_many(self, checks: Sequence[Tuple[str, int]], window: float = 60, cost: int = 1) -> List[RateLimitResult]:
+        def run(conn):
+            def write():
+                now = time.time()
+                buckets = []
+                for key, limit in checks:
+                    row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                    buckets.append((row[0], row[1], limit) if row else (None, now, limit))
+                steps = _take_all(buckets, now, window, cost)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(key, tokens, now) for (key, _), (tokens, _) in zip(checks, steps)]
+                )
+                return [result for _, result in steps]
+            return self._write(conn, write)
+        return await self._run(run)
+
+    async def append_event(self, channel: str, data: str) -> str:
+        def run(conn):
+            cursor = conn.execute("INSERT INTO events (channel, data, created_at) VALUES (?, ?, ?)", (channel, data, time.time()))
+            return str(cursor.lastrowid)
+        return await self._run(run)
+
+    async def read_events(self, channel: str, after: Optional[str]) -> List[Tuple[str, str]]:
+        def run(conn):
+            after_id = int(after) if after else 0
+            rows = conn.execute(
+                "SELECT id, data FROM events WHERE channel = ? AND id > ? ORDER BY id LIMIT 1000", (channel, after_id)
+            ).fetchall()
+            return [(str(i), data) for i, data in rows]
+        return await self._run(run)
+
+    async def last_event_id(self, channel: str) -> Optional[str]:
+        def run(conn):
+            row = conn.execute("SELECT max(id) FROM events WHERE channel = ?", (channel,)).fetchone()
+            return str(row[0]) if row and row[0] is not None else None
+        return await self._run(run)
+
+    async def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+
+
+class RedisStateBackend(StateBackend):
+    """
+    State in Redis (or any server speaking RESP2 with strings, EXPIRE and streams), shared across nodes.
+    Uses a small pool of plain asyncio connections; rate limiting is a sliding-window counter
+    built from INCRBY/EXPIRE/GET so it needs no server-side scripting.
+    """
+
+    shared = True
+    EVENT_STREAM_MAXLEN = 10000
+
+    def __init__(self, url: str, pool_size: int = 8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ssl = parsed.scheme == "rediss"
+        self.pool_size = pool_size
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # --- protocol ---
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _read_reply(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by state backend")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return StateBackendError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self._read_reply(reader) for _ in range(count)]
+        raise StateBackendError(f"Unexpected reply: {line!r}")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(self._encode(command))
+            await writer.drain()
+            reply = await self._read_reply(reader)
+            if isinstance(reply, StateBackendError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    async def pipeline(self, *commands) -> list:
+        """Sends several commands in one round trip; replies come back in order."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            reader, writer = connection
+            clean = False
+            try:
+                writer.write(b"".join(self._encode(command) for command in commands))
+                await writer.drain()
+                replies = [await self._read_reply(reader) for _ in commands]
+                clean = True
+            finally:
+                # Errors and cancellation alike can leave replies unread; such a connection is never reused
+                if clean:
+                    self._idle.append(connection)
+                else:
+                    writer.close()
+        for reply in replies:
+            if isinstance(reply, StateBackendError):
+                raise reply
+        return replies
+
+    async def execute(self, *args):
+        return (await self.pipeline(args))[0]
+
+    # --- operations ---
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.execute("GET", key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[str]]:
+        if not keys:
+            return []
+        return await self.execute("MGET", *keys)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        args = ["SET", key, value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        if nx:
+            args.append("NX")
+        return await self.execute(*args) == "OK"
+
+    async def expire(self, key: str, ttl: float) -> bool:
+        return await self.execute("PEXPIRE", key, int(ttl * 1000)) == 1
+
+    async def delete(self, key: str):
+        await self.execute("DEL", key)
+
+    async def rate_limit_many(self, checks: Sequence[Tuple[str, int]], window: float = 60, cost: int = 1) -> List[RateLimitResult]:
+        # Sliding-window counter: this window's count plus the previous window's, weighted by overlap
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        to_window_end = window - elapsed
+        commands = []
+        for key, _ in checks:
+            current, previous = f"rl:{key}:{index}", f"rl:{key}:{index - 1}"
+            commands += [("INCRBY", current, cost), ("EXPIRE", current, int(window * 2) + 1), ("GET", previous)]
+        replies = await self.pipeline(*commands)
+
+        results = []
+        for i, (_, limit) in enumerate(checks):
+            count, _, before = replies[3 * i:3 * i + 3]
+            before = int(before or 0)
+            estimate = before * (1 - elapsed / window) + count
+            if estimate <= limit:
+                results.append(RateLimitResult(True, limit, int(limit - estimate), to_window_end, 0.0))
+                continue
+            # The estimate falls by `before / window` per second until this window ends
+            excess = estimate - limit
+            retry_after = min(excess * window / before, to_window_end) if before else to_window_end
+            results.append(RateLimitResult(False, limit, 0, to_window_end, retry_after))
+
+        if not all(result.allowed for result in results):
+            # All or nothing: give back what this request added to every bucket
+            await self.pipeline(*[("DECRBY", f"rl:{key}:{index}", cost) for key, _ in checks])
+            results = [result._replace(remaining=min(limit, result.remaining + cost)) if result.allowed else result
+                       for result, (_, limit) in zip(results, checks)]
+        return results
+
+    async def append_event(self, channel: str, data: str) -> str:
+        return await self.execute("XADD", f"events:{channel}", "MAXLEN", "~", self.EVENT_STREAM_MAXLEN, "*", "data", data)
+
+    async def read_events(self, channel: str, after: Optional[str]) -> List[Tuple[str, str]]:
+        reply = await self.execute("XREAD", "COUNT", 1000, "STREAMS", f"events:{channel}", after or "0-0")
+        if not reply:
+            return []
+        _, entries = reply[0]
+        return [(entry_id, dict(zip(fields[::2], fields[1::2])).get("data")) for entry_id, fields in entries]
+
+    async def last_event_id(self, channel: str) -> Optional[str]:
+        reply = await self.execute("XREVRANGE", f"events:{channel}", "+", "-", "COUNT", 1)
+        return reply[0][0] if reply else None
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+def create_state_backend(url: str) -> StateBackend:
+    """memory:// (default), sqlite:///path/to/state.db or redis://[:password@]host:port/db."""
+    scheme = url.split("://", 1)[0] if "://" in url else url
+    if scheme in ("", "memory"):
+        return MemoryStateBackend(max_keys=settings.STATE_MEMORY_MAX_KEYS)
+    if scheme == "sqlite":
+        return SQLiteStateBackend(url[len("sqlite:///"):])
+    if scheme in ("redis", "rediss"):
+        return RedisStateBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
+
+
+state = create_state_backend(settings.STATE_BACKEND_URL)
@@ -0,0 +1,57 @@
+from typing import Tuple
+import json
+from fastapi import HTTPException
+from app.core.config import settings
+
+
+class UploadLimitMiddleware:
+    """
+    Caps request bodies on the upload endpoints before the multipart parser spools them to disk.
+    Requests that declare a larger Content-Length get 413 without their body being read; bodies
+    that turn out larger while streaming (chunked, or a wrong header) are cut off at the cap.
+    """
+
+    PATHS: Tuple[str, ...] = (f"{settings.API_V1_STR}/sandbox/process",)
+    # Multipart boundaries, part headers and the small form fields sent alongside the file
+    OVERHEAD_BYTES = 64 * 1024
+
+    def __init__(self, app, max_bytes: int = settings.SANDBOX_MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _detail(self) -> str:
+        return f"Upload exceeds the sandbox limit of {self.max_bytes} bytes"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].rstrip("/") not in self.PATHS:
+            return await self.app(scope, receive, send)
+
+        limit = self.max_bytes + self.OVERHEAD_BYTES
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            payload = json.dumps({"detail": self._detail()}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode()),
+                    (b"connection", b"close"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": payload})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing, so the app answers it like any other HTTPException
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,7 +1,9 @@
+from sqlalchemy import DateTime, func, inspect
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from app.db.models import Base
+from app.services.search import ensure_search_indexes
 
 engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=True)
 
@@ -9,9 +11,39 @@ AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+def add_missing_columns(conn):
+    """
+    create_all only creates missing tables; this adds columns and indexes introduced on existing tables.
+    New columns must be nullable (or have a Python-side default only).
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
+
+# SQLite has no date_trunc; strftime to the start of the bucket, which the DateTime type parses back
+SQLITE_TRUNC_FORMATS = {"minute": "%Y-%m-%d %H:%M:00", "hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+
+def truncate_time(db: AsyncSession, unit: str, column):
+    """date_trunc(unit, column) as a DateTime expression on the session's dialect."""
+    if db.bind.dialect.name == "sqlite":
+        return func.strftime(SQLITE_TRUNC_FORMATS[unit], column, type_=DateTime)
+    return func.date_trunc(unit, column, type_=DateTime)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(ensure_search_indexes)
 
 async def get_db():
     async with AsyncSessionLocal() as session:
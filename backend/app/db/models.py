@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON, Boolean, Text, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -61,17 +61,27 @@ class Campaign(Base):
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"))
     name = Column(String)
-    status = Column(String) # running, completed, failed
+    status = Column(String) # queued, running, cancelling, completed, failed, cancelled
     config = Column(JSON)
     started_at = Column(DateTime, default=datetime.utcnow)
     finished_at = Column(DateTime, nullable=True)
+    # Job queue lease: the worker running the campaign renews it; an expired lease means the worker died
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    # Progress, updated as batches of attack results are persisted
+    attacks_total = Column(Integer, nullable=True)
+    attacks_done = Column(Integer, default=0)
+    stop_reason = Column(String, nullable=True) # budget, deadline or settled when the plan was cut short
+    findings = Column(JSON, nullable=True) # settled verdicts: {agent_id: {attack type[+chain]: vulnerable/resistant}}
 
 class Incident(Base):
     __tablename__ = "incidents"
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"))
     agent_id = Column(Integer, ForeignKey("agents.id"))
-    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=True, index=True)
+    attack_index = Column(Integer, nullable=True) # position in the campaign's attack plan
     severity = Column(String) # low, medium, high, critical
     classification = Column(String)
     transcript_ref = Column(String)
@@ -102,6 +112,70 @@ class Metrics(Base):
     fp_rate = Column(Integer) # False Positive Rate 0-100
     remediation_efficacy = Column(Integer) # Percentage 0-100
 
+class MetricsCounter(Base):
+    # Raw per-tenant per-day sums behind Metrics, so rates can be updated incrementally and re-bucketed
+    __tablename__ = "metrics_counters"
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), primary_key=True)
+    date = Column(DateTime, primary_key=True)
+    attack_count = Column(Integer, default=0) # red-team incidents
+    exploit_count = Column(Integer, default=0) # red-team incidents classified vulnerability_found
+    detection_count = Column(Integer, default=0) # live (non-campaign) incidents
+    detection_seconds = Column(Integer, default=0) # sum of detected_at - created_at
+    false_positive_count = Column(Integer, default=0)
+    remediation_count = Column(Integer, default=0)
+    remediation_success_count = Column(Integer, default=0)
+
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+    name = Column(String, primary_key=True)
+    position = Column(JSON, default={}) # e.g. {"incident_id": 0, "remediation_id": 0}
+    version = Column(Integer, default=0) # optimistic lock between concurrent runs
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class AgentSketch(Base):
+    # Serialized hourly sketches (HLL / Count-Min / Space-Saving), one row per worker; readers merge the rows
+    __tablename__ = "agent_sketches"
+    agent_id = Column(Integer, ForeignKey("agents.id"), primary_key=True)
+    window_start = Column(DateTime, primary_key=True)
+    worker_id = Column(String, primary_key=True)
+    data = Column(LargeBinary)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class AttackCorpusEntry(Base):
+    # Generated adversarial prompts kept for reuse, with how often each one got through
+    __tablename__ = "attack_corpus"
+    __table_args__ = (UniqueConstraint("tenant_id", "intent_hash", "attack_type", "mutator_chain", "prompt_hash"),)
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), index=True)
+    intent_hash = Column(String, index=True) # sha256 of the normalized user intent / template
+    attack_type = Column(String)
+    mutator_chain = Column(String, default="") # e.g. "base64+leetspeak"; "" for unmutated
+    prompt_hash = Column(String)
+    prompt = Column(Text)
+    source = Column(String) # rts, generator
+    uses = Column(Integer, default=0)
+    successes = Column(Integer, default=0) # uses where the target's response was blocked or flagged
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=True)
+
+class AttackDelivery(Base):
+    # Attack payloads queued for SDK-mode agents, which fetch them by long-poll and post the responses back
+    __tablename__ = "attack_deliveries"
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"))
+    agent_id = Column(Integer, ForeignKey("agents.id"), index=True)
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), nullable=True, index=True)
+    attack_index = Column(Integer, nullable=True)
+    payload = Column(Text)
+    status = Column(String, default="pending") # pending, delivered, answered, expired
+    claim_token = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    visible_at = Column(DateTime, nullable=True) # a delivered, unanswered payload is handed out again after this
+    expires_at = Column(DateTime)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    answered_at = Column(DateTime, nullable=True)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
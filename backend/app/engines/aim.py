@@ -3,6 +3,7 @@ import json
 from typing import Dict
 import google.generativeai as genai
 from app.core.config import settings
+from app.engines.llm_stub import StubModel, stub_enabled
 
 class AgentIntentMonitor:
     def __init__(self):
@@ -10,7 +11,10 @@ class AgentIntentMonitor:
         
         # Initialize Gemini model for LLM-based action evaluation
         try:
-            if settings.GEMINI_API_KEY:
+            if stub_enabled():
+                 self.gemini_model = StubModel('gemini-2.0-flash')
+                 self.logger.info("AIM-Engine initialized with the stub LLM")
+            elif settings.GEMINI_API_KEY:
                  genai.configure(api_key=settings.GEMINI_API_KEY)
                  self.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
                  self.logger.info("AIM-Engine initialized with Gemini API")
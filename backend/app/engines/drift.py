@@ -0,0 +1,242 @@
+import logging
+import threading
+import time
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.events import truncate_time
+from app.db.models import Agent, ToolEvent
+
+
+def _allowed_set(allowed_tools) -> Optional[set]:
+    # allowed_tools is stored either as a list of names or a {name: config} mapping
+    if not allowed_tools:
+        return None
+    if isinstance(allowed_tools, dict):
+        return set(allowed_tools.keys())
+    return set(allowed_tools)
+
+
+class AgentToolHistory:
+    """
+    Hourly ring of tool-usage counts for one agent.
+    Rows are hours, columns are tools; every update is O(1) (amortised when the tool vocabulary grows).
+    """
+
+    def __init__(self, hours: int, head_hour: int, allowed_tools=None):
+        self.hours = hours
+        self.head_hour = head_hour
+        self.vocab: Dict[str, int] = {}
+        self.counts = np.zeros((hours, 8), dtype=np.int32)
+        self.totals = np.zeros(hours, dtype=np.int32)
+        self.outside = np.zeros(hours, dtype=np.int32) # calls to tools outside Agent.allowed_tools
+        self.allowed = _allowed_set(allowed_tools)
+        self.version = 0
+        self.loaded_at = time.monotonic()
+        self._scores: Optional[Tuple[int, int, np.ndarray]] = None # (version, head_hour, scores)
+
+    def _column(self, tool_name: str) -> int:
+        col = self.vocab.get(tool_name)
+        if col is None:
+            col = len(self.vocab)
+            self.vocab[tool_name] = col
+            if col >= self.counts.shape[1]:
+                grown = np.zeros((self.hours, self.counts.shape[1] * 2), dtype=np.int32)
+                grown[:, :self.counts.shape[1]] = self.counts
+                self.counts = grown
+        return col
+
+    def advance(self, hour: int):
+        if hour <= self.head_hour:
+            return
+        if hour - self.head_hour >= self.hours:
+            self.counts[:] = 0
+            self.totals[:] = 0
+            self.outside[:] = 0
+        else:
+            rows = np.arange(self.head_hour + 1, hour + 1) % self.hours
+            self.counts[rows] = 0
+            self.totals[rows] = 0
+            self.outside[rows] = 0
+        self.head_hour = hour
+        self.version += 1
+
+    def add(self, hour: int, tool_name: str, count: int = 1):
+        if hour > self.head_hour:
+            self.advance(hour)
+        elif hour <= self.head_hour - self.hours:
+            return
+        row = hour % self.hours
+        self.counts[row, self._column(tool_name)] += count
+        self.totals[row] += count
+        if self.allowed is not None and tool_name not in self.allowed:
+            self.outside[row] += count
+        self.version += 1
+
+    def chronological(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Oldest-first views of (counts, totals, outside)."""
+        rows = np.arange(self.head_hour - self.hours + 1, self.head_hour + 1) % self.hours
+        used = len(self.vocab)
+        return self.counts[rows, :used], self.totals[rows], self.outside[rows]
+
+
+class AutonomyDriftEngine:
+    """
+    Scores how far an agent's recent tool usage has moved from its own trailing baseline.
+
+    Per hour bucket the score combines:
+      - Jensen-Shannon divergence between the bucket's tool distribution and the trailing baseline,
+      - deviation of the call rate from the baseline rate,
+      - share of calls to tools outside Agent.allowed_tools.
+    All buckets are scored at once with NumPy and the result is cached until new events arrive.
+    """
+
+    HISTORY_HOURS = 24 * 7
+    BASELINE_HOURS = 24
+    WEIGHTS = (0.5, 0.25, 0.25) # distribution, rate, out-of-allowlist
+
+    def __init__(self, resync_seconds: float = 600):
+        self.logger = logging.getLogger("Veridian.Drift")
+        self.resync_seconds = resync_seconds
+        self._agents: Dict[int, AgentToolHistory] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hour(ts: Optional[float] = None) -> int:
+        return int((ts if ts is not None else time.time()) // 3600)
+
+    def is_warm(self, agent_id: int) -> bool:
+        history = self._agents.get(agent_id)
+        return history is not None and time.monotonic() - history.loaded_at < self.resync_seconds
+
+    def seed(self, agent_id: int, allowed_tools, buckets: Iterable[Tuple[float, str, int]]):
+        """Replaces an agent's history with (epoch_seconds, tool_name, count) hour buckets loaded from the DB."""
+        history = AgentToolHistory(self.HISTORY_HOURS, self._hour(), allowed_tools)
+        for ts, tool_name, count in buckets:
+            history.add(self._hour(ts), tool_name or "unknown", int(count or 0))
+        with self._lock:
+            self._agents[agent_id] = history
+
+    def record(self, agent_id: int, tool_name: str, allowed_tools=None):
+        """Counts one tool call. Cold agents are skipped; their next read seeds from the DB."""
+        with self._lock:
+            history = self._agents.get(agent_id)
+            if history is None:
+                return
+            if allowed_tools is not None:
+                history.allowed = _allowed_set(allowed_tools)
+            history.add(self._hour(), tool_name or "unknown")
+
+    def _score(self, history: AgentToolHistory) -> np.ndarray:
+        counts, totals, outside = history.chronological()
+        counts = counts.astype(np.float64)
+        totals = totals.astype(np.float64)
+        hours = len(totals)
+        if counts.shape[1] == 0:
+            return np.zeros(hours)
+
+        # Trailing-window sums via cumulative sums: baseline for hour i covers [i-B, i)
+        B = self.BASELINE_HOURS
+        cum_counts = np.vstack([np.zeros((1, counts.shape[1])), np.cumsum(counts, axis=0)])
+        cum_totals = np.concatenate([[0.0], np.cumsum(totals)])
+        cum_sq = np.concatenate([[0.0], np.cumsum(totals ** 2)])
+        end = np.arange(hours)
+        start = np.maximum(end - B, 0)
+        span = np.maximum(end - start, 1)
+        base_counts = cum_counts[end] - cum_counts[start]
+        base_totals = cum_totals[end] - cum_totals[start]
+
+        # Distribution drift (JSD, base 2, in [0, 1])
+        p = counts / np.maximum(totals, 1)[:, None]
+        q = base_counts / np.maximum(base_totals, 1)[:, None]
+        m = 0.5 * (p + q)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kl_pm = np.where(p > 0, p * np.log2(p / m), 0.0).sum(axis=1)
+            kl_qm = np.where(q > 0, q * np.log2(q / m), 0.0).sum(axis=1)
+        jsd = np.clip(0.5 * (kl_pm + kl_qm), 0.0, 1.0)
+        # Only meaningful when both the hour and its baseline saw traffic
+        jsd = np.where((totals > 0) & (base_totals > 0), jsd, 0.0)
+
+        # Rate drift: z-score of the hourly call count against the baseline hours
+        mean = base_totals / span
+        var = np.maximum((cum_sq[end] - cum_sq[start]) / span - mean ** 2, 0.0)
+        z = np.abs(totals - mean) / (np.sqrt(var) + 1.0)
+        rate = np.where(end >= 1, 1.0 - np.exp(-z / 3.0), 0.0)
+
+        out_share = outside / np.maximum(totals, 1)
+
+        w_dist, w_rate, w_out = self.WEIGHTS
+        return np.clip(w_dist * jsd + w_rate * rate + w_out * out_share, 0.0, 1.0)
+
+    def scores(self, agent_id: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(hour_start_epochs, drift_scores, observed_calls), oldest first, for the whole history."""
+        with self._lock:
+            history = self._agents.get(agent_id)
+            if history is None:
+                return np.zeros(0), np.zeros(0), 0
+            history.advance(self._hour())
+            cached = history._scores
+            if cached is None or cached[0] != history.version or cached[1] != history.head_hour:
+                cached = (history.version, history.head_hour, self._score(history))
+                history._scores = cached
+            head_hour = history.head_hour
+            samples = int(history.totals.sum())
+        hours = np.arange(head_hour - self.HISTORY_HOURS + 1, head_hour + 1) * 3600
+        return hours, cached[2], samples
+
+    def sparkline(self, agent_id: int, hours: int = 24) -> Dict:
+        hour_starts, drift, samples = self.scores(agent_id)
+        hours = max(1, min(hours, self.HISTORY_HOURS))
+        hour_starts, drift = hour_starts[-hours:], drift[-hours:]
+
+        # Direction from the last few hours against the few before them
+        status = "stable"
+        if len(drift) >= 6:
+            recent, previous = drift[-3:].mean(), drift[-6:-3].mean()
+            if recent - previous > 0.05:
+                status = "rising"
+            elif previous - recent > 0.05:
+                status = "falling"
+
+        return {
+            "timestamps": [datetime.utcfromtimestamp(ts).isoformat() for ts in hour_starts.tolist()],
+            "drift_score": [round(float(s), 3) for s in drift],
+            "current_status": status,
+            # More observed calls -> more confidence in the baseline
+            "confidence": round(float(1.0 - 1.0 / np.sqrt(1.0 + samples)), 2) if samples else 0.0
+        }
+
+    def current(self, agent_id: int) -> float:
+        _, drift, _ = self.scores(agent_id)
+        return float(drift[-1]) if len(drift) else 0.0
+
+    async def ensure_loaded(self, db: AsyncSession, agent_ids: List[int]):
+        """Seeds cold agents from ToolEvent history in one grouped query."""
+        cold = [a for a in agent_ids if not self.is_warm(a)]
+        if not cold:
+            return
+        since = datetime.utcnow() - timedelta(hours=self.HISTORY_HOURS)
+        hour = truncate_time(db, 'hour', ToolEvent.timestamp).label('hour')
+        rows = (await db.execute(
+            select(ToolEvent.agent_id, hour, ToolEvent.tool_name, func.count(ToolEvent.id)).where(
+                ToolEvent.agent_id.in_(cold),
+                ToolEvent.timestamp >= since
+            ).group_by(ToolEvent.agent_id, hour, ToolEvent.tool_name)
+        )).all()
+        allowed = dict((await db.execute(
+            select(Agent.id, Agent.allowed_tools).where(Agent.id.in_(cold))
+        )).all())
+
+        buckets = {agent_id: [] for agent_id in cold}
+        for agent_id, bucket, tool_name, count in rows:
+            buckets[agent_id].append((bucket.replace(tzinfo=timezone.utc).timestamp(), tool_name, count))
+        for agent_id, agent_buckets in buckets.items():
+            self.seed(agent_id, allowed.get(agent_id), agent_buckets)
+        self.logger.info(f"Loaded tool history for {len(cold)} agent(s)")
+
+
+drift_engine = AutonomyDriftEngine(resync_seconds=settings.DRIFT_RESYNC_SECONDS)
@@ -1,6 +1,7 @@
 import logging
 import google.generativeai as genai
 from app.core.config import settings
+from app.engines.llm_stub import StubModel, stub_enabled
 from typing import Optional
 
 logger = logging.getLogger("Veridian.LLM")
@@ -9,7 +10,10 @@ class LLMEngine:
     def __init__(self):
         self.model = None
         try:
-            if settings.GEMINI_API_KEY:
+            if stub_enabled():
+                self.model = StubModel('gemini-2.0-flash')
+                logger.info("LLM Engine initialized with the stub LLM")
+            elif settings.GEMINI_API_KEY:
                 genai.configure(api_key=settings.GEMINI_API_KEY)
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
                 logger.info("LLM Engine initialized with Gemini API")
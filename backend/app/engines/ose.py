@@ -4,6 +4,7 @@ import logging
 from typing import Dict, List, Optional
 import google.generativeai as genai
 from app.core.config import settings
+from app.engines.llm_stub import StubModel, stub_enabled
 
 class OutputSafetyEvaluator:
     def __init__(self):
@@ -11,7 +12,10 @@ class OutputSafetyEvaluator:
         
         # Initialize Gemini model for LLM-based safety evaluation
         try:
-            if settings.GEMINI_API_KEY:
+            if stub_enabled():
+                self.gemini_model = StubModel('gemini-2.0-flash')
+                self.logger.info("OSE-Engine initialized with the stub LLM")
+            elif settings.GEMINI_API_KEY:
                 genai.configure(api_key=settings.GEMINI_API_KEY)
                 self.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
                 self.logger.info("OSE-Engine initialized with Gemini API")
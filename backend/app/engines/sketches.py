@@ -0,0 +1,164 @@
+import hashlib
+import json
+import math
+import struct
+import zlib
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+def _hash128(item: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(item.encode("utf-8", "replace"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+class HyperLogLog:
+    """Distinct-count estimator; relative error is about 1.04 / sqrt(2**p)."""
+
+    def __init__(self, p: int = 11, registers: Optional[np.ndarray] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, item: str):
+        x, _ = _hash128(item)
+        index = x >> (64 - self.p)
+        rest = (x << self.p) & 0xFFFFFFFFFFFFFFFF
+        rank = 65 - rest.bit_length() if rest else 64 - self.p + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = self.m
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+
+class CountMinSketch:
+    """Point-frequency estimator; never underestimates, overestimates by at most e/width of the total."""
+
+    def __init__(self, width: int = 512, depth: int = 4, table: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+
+    def _columns(self, item: str) -> np.ndarray:
+        h1, h2 = _hash128(item)
+        return np.array([(h1 + i * h2) % self.width for i in range(self.depth)])
+
+    def add(self, item: str, count: int = 1) -> int:
+        columns = self._columns(item)
+        self.table[self._rows, columns] += count
+        return int(self.table[self._rows, columns].min())
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[self._rows, self._columns(item)].min())
+
+    def merge(self, other: "CountMinSketch"):
+        self.table += other.table
+
+
+class SpaceSaving:
+    """Top-k heavy hitters in O(k) space; counts may overestimate by at most the stored error."""
+
+    def __init__(self, k: int = 64):
+        self.k = k
+        self.counters: Dict[str, List[int]] = {} # item -> [count, error]
+
+    def add(self, item: str, count: int = 1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.k:
+            self.counters[item] = [count, 0]
+        else:
+            # Replace the smallest counter; the new item inherits its count as error
+            victim = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[item] = [floor + count, floor]
+
+    def merge(self, other: "SpaceSaving"):
+        for item, (count, error) in other.counters.items():
+            counter = self.counters.setdefault(item, [0, 0])
+            counter[0] += count
+            counter[1] += error
+        if len(self.counters) > self.k:
+            keep = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)[:self.k]
+            self.counters = dict(keep)
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+        return [(item, count, error) for item, (count, error) in ranked]
+
+
+class AgentSketches:
+    """
+    The sketches kept for one agent over one time window: distinct prompts (HLL),
+    attack phrases and tool arguments (Space-Saving for top-k, Count-Min for point lookups).
+    """
+
+    HLL_P = 11
+    CMS_WIDTH = 512
+    CMS_DEPTH = 4
+    TOP_K = 64
+
+    def __init__(self):
+        self.prompts = HyperLogLog(self.HLL_P)
+        self.phrases = SpaceSaving(self.TOP_K)
+        self.phrase_counts = CountMinSketch(self.CMS_WIDTH, self.CMS_DEPTH)
+        self.tool_args = SpaceSaving(self.TOP_K)
+        self.tool_arg_counts = CountMinSketch(self.CMS_WIDTH, self.CMS_DEPTH)
+
+    def merge(self, other: "AgentSketches"):
+        self.prompts.merge(other.prompts)
+        self.phrases.merge(other.phrases)
+        self.phrase_counts.merge(other.phrase_counts)
+        self.tool_args.merge(other.tool_args)
+        self.tool_arg_counts.merge(other.tool_arg_counts)
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({
+            "v": 1,
+            "phrases": self.phrases.counters,
+            "tool_args": self.tool_args.counters,
+        }).encode()
+        body = b"".join([
+            struct.pack("<I", len(header)), header,
+            self.prompts.registers.tobytes(),
+            self.phrase_counts.table.tobytes(),
+            self.tool_arg_counts.table.tobytes(),
+        ])
+        # Mostly-empty registers and tables compress well
+        return zlib.compress(body)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "AgentSketches":
+        body = zlib.decompress(data)
+        (header_len,) = struct.unpack_from("<I", body)
+        offset = 4 + header_len
+        header = json.loads(body[4:offset])
+
+        sketches = cls()
+        sketches.phrases.counters = header["phrases"]
+        sketches.tool_args.counters = header["tool_args"]
+
+        registers = 1 << cls.HLL_P
+        sketches.prompts.registers = np.frombuffer(body, dtype=np.uint8, count=registers, offset=offset).copy()
+        offset += registers
+        cells = cls.CMS_WIDTH * cls.CMS_DEPTH
+        for cms in (sketches.phrase_counts, sketches.tool_arg_counts):
+            cms.table = np.frombuffer(body, dtype=np.uint32, count=cells, offset=offset).reshape(cls.CMS_DEPTH, cls.CMS_WIDTH).copy()
+            offset += cells * 4
+        return sketches
@@ -1,11 +1,28 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.api import agents, monitor, redteam, health, incidents, webhooks, tenants, metrics, auth, workspace, analytics, logs, keys, notifications, llm_models, agent_test, sandbox
+from app.core.ratelimit import RateLimitMiddleware
+from app.core.uploads import UploadLimitMiddleware
+from app.api import agents, monitor, redteam, health, incidents, webhooks, tenants, metrics, auth, workspace, analytics, logs, keys, notifications, llm_models, agent_test, sandbox, events, export
 from app.db.events import init_db
+from app.services.log_pipeline import install_log_pipeline, log_store
+from app.services.metrics_job import metrics_job
+from app.services.event_bus import event_bus, presence
+from app.core.state import state
+from app.core.extractors import document_extractor
+from app.services.redteam.executor import campaign_executor
+from app.services.redteam.delivery import attack_inbox
+from app.services.campaign_worker import campaign_worker
+from app.services.sketch_store import sketch_store
 
 app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json")
 
+# Ingest rate limits; added before CORS so 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
+# Oversized sandbox uploads are refused before they are spooled to disk
+app.add_middleware(UploadLimitMiddleware)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +39,28 @@ app.add_middleware(
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    install_log_pipeline()
+    log_store.start()
+    metrics_job.start()
+    presence.start()
+    event_bus.start()
+    attack_inbox.start()
+    if settings.CAMPAIGN_WORKER_EMBEDDED:
+        campaign_worker.start()
+    sketch_store.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await campaign_worker.stop()
+    event_bus.stop()
+    attack_inbox.stop()
+    presence.stop()
+    await sketch_store.stop()
+    metrics_job.stop()
+    await log_store.stop()
+    await campaign_executor.aclose()
+    document_extractor.shutdown()
+    await state.close()
 
 app.include_router(health.router, prefix="/health", tags=["health"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -40,6 +79,8 @@ app.include_router(notifications.router, prefix=f"{settings.API_V1_STR}/notifica
 app.include_router(llm_models.router, prefix=f"{settings.API_V1_STR}/models", tags=["models"])
 app.include_router(agent_test.router, prefix=f"{settings.API_V1_STR}/agent-test", tags=["agent-test"])
 app.include_router(sandbox.router, prefix=f"{settings.API_V1_STR}/sandbox", tags=["sandbox"])
+app.include_router(events.router, prefix=f"{settings.API_V1_STR}/events", tags=["events"])
+app.include_router(export.router, prefix=f"{settings.API_V1_STR}/export", tags=["export"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,187 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import update, func, or_, and_, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.events import AsyncSessionLocal
+from app.db.models import Campaign, Tenant
+
+logger = logging.getLogger("Veridian.CampaignQueue")
+
+ACTIVE = ("running", "cancelling")
+FINISHED = ("completed", "failed", "cancelled")
+
+
+def _lease_expired(now: datetime):
+    return or_(Campaign.lease_expires_at == None, Campaign.lease_expires_at < now)
+
+
+class CampaignQueue:
+    """
+    Durable campaign queue on the campaigns table.
+    Workers claim a queued campaign (or one whose lease expired) with a conditional UPDATE,
+    renew the lease while running it, and stop when it is cancelled or the lease is lost.
+    """
+
+    def __init__(self, lease_seconds: float = 60, max_attempts: int = 3):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def _lease_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    @staticmethod
+    def tenant_limit(plan: Optional[str]) -> int:
+        limits = settings.CAMPAIGN_PLAN_CONCURRENCY
+        return limits.get(plan or "free", limits["free"])
+
+    @staticmethod
+    async def _running_count(db: AsyncSession, tenant_id: int, now: datetime) -> int:
+        return (await db.execute(
+            select(func.count(Campaign.id)).where(
+                Campaign.tenant_id == tenant_id,
+                Campaign.status.in_(ACTIVE),
+                Campaign.lease_expires_at >= now
+            )
+        )).scalar() or 0
+
+    async def _settle_abandoned(self, db: AsyncSession, campaign_id: int, status: str, attempts: int, now: datetime) -> bool:
+        """Finishes an expired job that must not be retried. Returns True if it was settled."""
+        if status == "cancelling":
+            final = "cancelled"
+        elif attempts >= self.max_attempts:
+            final = "failed"
+        else:
+            return False
+        await db.execute(
+            update(Campaign)
+            .where(Campaign.id == campaign_id, Campaign.status == status, _lease_expired(now))
+            .values(status=final, finished_at=now, lease_owner=None, lease_expires_at=None)
+        )
+        await db.commit()
+        logger.warning(f"Campaign {campaign_id} abandoned by its worker; marked {final}")
+        return True
+
+    async def claim(self, worker_id: str) -> Optional[int]:
+        """Leases the oldest runnable campaign whose tenant is under its concurrency limit."""
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            candidates = (await db.execute(
+                select(Campaign.id, Campaign.tenant_id, Campaign.status, Campaign.attempts, Tenant.plan)
+                .join(Tenant, Tenant.id == Campaign.tenant_id, isouter=True)
+                .where(or_(
+                    Campaign.status == "queued",
+                    and_(Campaign.status.in_(ACTIVE), _lease_expired(now))
+                ))
+                .order_by(Campaign.id)
+                .limit(50)
+            )).all()
+
+            running = {}
+            for campaign_id, tenant_id, status, attempts, plan in candidates:
+                if status in ACTIVE and await self._settle_abandoned(db, campaign_id, status, attempts or 0, now):
+                    continue
+
+                limit = self.tenant_limit(plan)
+                if tenant_id not in running:
+                    running[tenant_id] = await self._running_count(db, tenant_id, now)
+                if running[tenant_id] >= limit:
+                    continue
+
+                result = await db.execute(
+                    update(Campaign)
+                    .where(Campaign.id == campaign_id, Campaign.status == status, or_(Campaign.status == "queued", _lease_expired(now)))
+                    .values(
+                        status="running", lease_owner=worker_id, lease_expires_at=self._lease_until(),
+                        attempts=func.coalesce(Campaign.attempts, 0) + 1, started_at=now
+                    )
+                )
+                await db.commit()
+                if result.rowcount != 1:
+                    continue # another worker got it first
+
+                # Two workers can pass the limit check for the same tenant at once; the later one backs off
+                if await self._running_count(db, tenant_id, now) > limit:
+                    await self.release(campaign_id, worker_id, db=db)
+                    running[tenant_id] = limit
+                    continue
+
+                logger.info(f"Worker {worker_id} claimed campaign {campaign_id}")
+                return campaign_id
+        return None
+
+    async def heartbeat(self, campaign_id: int, worker_id: str) -> Optional[str]:
+        """Renews the lease. Returns the campaign status, or None if this worker no longer holds it."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Campaign)
+                .where(Campaign.id == campaign_id, Campaign.lease_owner == worker_id, Campaign.status.in_(ACTIVE))
+                .values(lease_expires_at=self._lease_until())
+            )
+            await db.commit()
+            if result.rowcount != 1:
+                return None
+            return (await db.execute(select(Campaign.status).where(Campaign.id == campaign_id))).scalar()
+
+    async def finish(self, campaign_id: int, worker_id: str, status: str,
+                     stop_reason: Optional[str] = None, findings: Optional[Dict] = None) -> bool:
+        """
+        Records the outcome, if this worker still holds the lease. A campaign cancelled while it ran
+        ends as cancelled whatever the outcome. Returns False if the lease was lost.
+        """
+        values = dict(
+            status=case((Campaign.status == "cancelling", "cancelled"), else_=status),
+            finished_at=datetime.utcnow(), lease_owner=None, lease_expires_at=None
+        )
+        if stop_reason is not None:
+            values["stop_reason"] = stop_reason
+        if findings is not None:
+            values["findings"] = findings
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Campaign)
+                .where(Campaign.id == campaign_id, Campaign.lease_owner == worker_id, Campaign.status.in_(ACTIVE))
+                .values(**values)
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            logger.warning(f"Worker {worker_id} no longer holds campaign {campaign_id}; {status} not recorded")
+            return False
+        return True
+
+    async def release(self, campaign_id: int, worker_id: str, db: Optional[AsyncSession] = None):
+        """Puts a claimed campaign back in the queue (worker shutting down or over the tenant limit)."""
+        values = dict(status="queued", lease_owner=None, lease_expires_at=None, attempts=Campaign.attempts - 1)
+        query = update(Campaign).where(Campaign.id == campaign_id, Campaign.lease_owner == worker_id, Campaign.status == "running")
+        if db is not None:
+            await db.execute(query.values(**values))
+            await db.commit()
+            return
+        async with AsyncSessionLocal() as session:
+            await session.execute(query.values(**values))
+            await session.commit()
+
+    async def cancel(self, db: AsyncSession, campaign_id: int, tenant_id: int) -> Optional[str]:
+        """Cancels a queued campaign immediately, or asks the worker running it to stop. Returns the new status."""
+        campaign = (await db.execute(
+            select(Campaign).where(Campaign.id == campaign_id, Campaign.tenant_id == tenant_id)
+        )).scalars().first()
+        if campaign is None:
+            return None
+        if campaign.status == "queued":
+            await db.execute(
+                update(Campaign).where(Campaign.id == campaign_id, Campaign.status == "queued")
+                .values(status="cancelled", finished_at=datetime.utcnow())
+            )
+        elif campaign.status == "running":
+            await db.execute(
+                update(Campaign).where(Campaign.id == campaign_id, Campaign.status == "running")
+                .values(status="cancelling")
+            )
+        await db.commit()
+        return (await db.execute(select(Campaign.status).where(Campaign.id == campaign_id))).scalar()
+
+
+campaign_queue = CampaignQueue(lease_seconds=settings.CAMPAIGN_LEASE_SECONDS, max_attempts=settings.CAMPAIGN_MAX_ATTEMPTS)
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextlib import suppress
+from typing import Dict, Optional
+from app.core.config import settings
+from app.services.campaign_queue import campaign_queue
+from app.services.redteam_runner import redteam_runner
+
+logger = logging.getLogger("Veridian.CampaignWorker")
+
+
+class CampaignWorker:
+    """
+    Pulls campaigns from the DB queue and runs up to `slots` of them at once.
+    Run standalone with `python -m app.services.campaign_worker` to keep red-team load out of
+    the API processes (and set CAMPAIGN_WORKER_EMBEDDED=false for the API).
+    """
+
+    def __init__(self, slots: int = 4, poll_seconds: float = 2):
+        self.slots = slots
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_job(self, campaign_id: int):
+        run = asyncio.create_task(redteam_runner.run_campaign(campaign_id))
+        try:
+            while True:
+                done, _ = await asyncio.wait({run}, timeout=campaign_queue.lease_seconds / 3)
+                if done:
+                    break
+                status = await campaign_queue.heartbeat(campaign_id, self.worker_id)
+                if status == "running":
+                    continue
+                # Cancelled by the user, or the lease was lost to another worker
+                run.cancel()
+                with suppress(asyncio.CancelledError):
+                    await run
+                if status == "cancelling":
+                    await campaign_queue.finish(campaign_id, self.worker_id, "cancelled")
+                    logger.info(f"Campaign {campaign_id} cancelled")
+                else:
+                    logger.warning(f"Lost the lease on campaign {campaign_id}; stopped")
+                return
+
+            outcome = run.result()
+            if outcome is not None:
+                await campaign_queue.finish(campaign_id, self.worker_id, "completed", **outcome)
+        except asyncio.CancelledError:
+            # Worker shutting down: hand the campaign back to the queue
+            run.cancel()
+            with suppress(asyncio.CancelledError):
+                await run
+            await campaign_queue.release(campaign_id, self.worker_id)
+            raise
+        except Exception as e:
+            logger.error(f"Campaign {campaign_id} failed: {e}")
+            await campaign_queue.finish(campaign_id, self.worker_id, "failed")
+        finally:
+            self._jobs.pop(campaign_id, None)
+
+    async def poll_once(self) -> int:
+        """Claims campaigns until the slots are full or the queue is empty. Returns how many were started."""
+        started = 0
+        while len(self._jobs) < self.slots:
+            campaign_id = await campaign_queue.claim(self.worker_id)
+            if campaign_id is None:
+                break
+            self._jobs[campaign_id] = asyncio.create_task(self._run_job(campaign_id))
+            started += 1
+        return started
+
+    async def run(self):
+        logger.info(f"Campaign worker {self.worker_id} started with {self.slots} slot(s)")
+        try:
+            while True:
+                try:
+                    await self.poll_once()
+                except Exception as e:
+                    logger.error(f"Campaign queue poll failed: {e}")
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+campaign_worker = CampaignWorker(slots=settings.CAMPAIGN_WORKER_SLOTS, poll_seconds=settings.CAMPAIGN_POLL_SECONDS)
+
+if __name__ == "__main__":
+    from app.core.state import state
+    from app.db.events import init_db
+    from app.services.event_bus import event_bus
+    from app.services.log_pipeline import install_log_pipeline, log_store
+    from app.services.redteam.executor import campaign_executor
+
+    async def main():
+        logging.basicConfig(level=logging.INFO)
+        await init_db()
+        # Same relays as the API process, so campaign incidents reach SSE subscribers and engine logs reach /logs
+        install_log_pipeline()
+        log_store.start()
+        event_bus.start()
+        try:
+            await campaign_worker.run()
+        finally:
+            event_bus.stop()
+            with suppress(Exception):
+                await event_bus.flush()
+            await log_store.stop()
+            await campaign_executor.aclose()
+            await state.close()
+
+    asyncio.run(main())
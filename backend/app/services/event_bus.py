@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.state import state, StateBackend
+
+logger = logging.getLogger("Veridian.Events")
+
+
+class Subscription:
+    """A subscriber's bounded buffer. When full, the oldest event is dropped to make room."""
+
+    def __init__(self, tenant_id: int, maxsize: int):
+        self.tenant_id = tenant_id
+        self.buffer: deque = deque(maxlen=maxsize)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, event: Dict):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(event)
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> Tuple[List[Dict], int]:
+        """Waits up to `timeout` for events; returns (events, number dropped since the last batch)."""
+        if not self.buffer:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return [], 0
+        events = list(self.buffer)
+        self.buffer.clear()
+        dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventBus:
+    """
+    Per-tenant pub/sub for live dashboard updates.
+    Events reach this worker's subscribers immediately; with a shared state backend they are
+    also relayed through its event log so subscribers connected to other workers receive them.
+    """
+
+    CHANNEL = "live"
+    RELAY_INTERVAL = 0.25 # seconds
+
+    def __init__(self, backend: StateBackend, buffer_size: int = 256):
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+        self._outbox: List[str] = []
+        self._cursor: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, tenant_id: int) -> Subscription:
+        subscription = Subscription(tenant_id, self.buffer_size)
+        self._subscribers.setdefault(tenant_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.tenant_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.tenant_id]
+
+    def _deliver(self, tenant_id: int, event: Dict):
+        for subscription in self._subscribers.get(tenant_id, ()):
+            subscription.push(event)
+
+    def publish(self, tenant_id: int, event_type: str, data: Dict):
+        event = {
+            "id": next(self._ids),
+            "type": event_type,
+            "timestamp": datetime.utcnow().isoformat(),
+            "data": data,
+        }
+        self._deliver(tenant_id, event)
+        # Only queued while the relay runs to drain it; otherwise the event stays local
+        if self._task is not None:
+            self._outbox.append(json.dumps({"origin": self.origin, "tenant_id": tenant_id, "event": event}))
+
+    def publish_incident(self, incident):
+        self.publish(incident.tenant_id, "incident", {
+            "id": incident.id,
+            "agent_id": incident.agent_id,
+            "campaign_id": incident.campaign_id,
+            "severity": incident.severity,
+            "classification": incident.classification,
+            "status": incident.status,
+        })
+
+    def publish_verdict(self, tenant_id: int, agent_id: int, source: str, decision: str, incident_id: Optional[int] = None):
+        if decision == "allow":
+            return
+        self.publish(tenant_id, "verdict", {
+            "agent_id": agent_id,
+            "source": source,
+            "decision": decision,
+            "incident_id": incident_id,
+        })
+
+    async def flush(self):
+        """Pushes this worker's queued events to the shared log."""
+        outbox, self._outbox = self._outbox, []
+        for data in outbox:
+            await self.backend.append_event(self.CHANNEL, data)
+
+    async def relay_once(self):
+        """Pushes this worker's events to the shared log and delivers other workers' events locally."""
+        await self.flush()
+        for entry_id, data in await self.backend.read_events(self.CHANNEL, self._cursor):
+            self._cursor = entry_id
+            message = json.loads(data)
+            if message["origin"] != self.origin:
+                self._deliver(message["tenant_id"], message["event"])
+
+    async def _relay(self):
+        self._cursor = await self.backend.last_event_id(self.CHANNEL)
+        while True:
+            await asyncio.sleep(self.RELAY_INTERVAL)
+            try:
+                await self.relay_once()
+            except Exception as e:
+                logger.warning(f"Event relay failed: {e}")
+
+    def start(self):
+        if self.backend.shared and self._task is None:
+            self._task = asyncio.create_task(self._relay())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class PresenceTracker:
+    """
+    Derives agent connect/disconnect events from heartbeats (the same updates that set Agent.last_seen).
+    An agent counts as connected while it was seen within the last `timeout` seconds, as in /agents/{id}/status.
+    Presence lives in the state backend with a TTL, so with a shared backend every worker agrees on it
+    and each connect/disconnect is reported once.
+    """
+
+    def __init__(self, bus: EventBus, backend: StateBackend, timeout: float = 60):
+        self.bus = bus
+        self.backend = backend
+        self.timeout = timeout
+        # (tenant_id, agent_id) -> (last refresh from this worker, session token)
+        self._seen: Dict[Tuple[int, int], Tuple[float, Optional[str]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(tenant_id: int, agent_id: int) -> str:
+        return f"presence:{tenant_id}:{agent_id}"
+
+    async def touch(self, tenant_id: int, agent_id: int):
+        seen = self._seen.get((tenant_id, agent_id))
+        now = time.monotonic()
+        # Refresh the shared entry a few times per timeout rather than on every heartbeat
+        if seen is not None and now - seen[0] < self.timeout / 4:
+            return
+        key = self._key(tenant_id, agent_id)
+        token = uuid.uuid4().hex
+        try:
+            created = await self.backend.set(key, token, ttl=self.timeout, nx=True)
+            if not created and not await self.backend.expire(key, self.timeout):
+                # Expired between the two calls
+                created = await self.backend.set(key, token, ttl=self.timeout, nx=True)
+            if created:
+                self.bus.publish(tenant_id, "agent_connected", {"agent_id": agent_id})
+            else:
+                token = seen[1] if seen else await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Presence update failed: {e}")
+            return
+        self._seen[(tenant_id, agent_id)] = (now, token)
+
+    async def sweep(self):
+        if not self._seen:
+            return
+        known = list(self._seen)
+        tokens = await self.backend.mget([self._key(*k) for k in known])
+        for (tenant_id, agent_id), token in zip(known, tokens):
+            if token is not None:
+                # Track the current session even if it was started through another worker
+                last, _ = self._seen[(tenant_id, agent_id)]
+                self._seen[(tenant_id, agent_id)] = (last, token)
+                continue
+            _, ended = self._seen.pop((tenant_id, agent_id))
+            # Every worker that knew the agent notices; only the one that claims the session reports it
+            if await self.backend.set(f"presence:ended:{ended}", "1", ttl=self.timeout, nx=True):
+                self.bus.publish(tenant_id, "agent_disconnected", {"agent_id": agent_id})
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(min(10, self.timeout / 2))
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning(f"Presence sweep failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+event_bus = EventBus(state, buffer_size=settings.EVENT_STREAM_BUFFER)
+presence = PresenceTracker(event_bus, state, timeout=settings.PRESENCE_TIMEOUT_SECONDS)
@@ -0,0 +1,187 @@
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from sqlalchemy.future import select
+from app.db.events import AsyncSessionLocal
+from app.db.models import Message, Incident, ToolEvent
+
+logger = logging.getLogger("Veridian.Export")
+
+# Columns exported per table, with the Arrow type name used for each
+EXPORT_TABLES = {
+    "messages": (Message, [
+        ("id", "int64"), ("tenant_id", "int64"), ("agent_id", "int64"), ("direction", "string"),
+        ("payload", "json"), ("decision", "string"), ("timestamp", "timestamp"),
+    ]),
+    "incidents": (Incident, [
+        ("id", "int64"), ("tenant_id", "int64"), ("agent_id", "int64"), ("campaign_id", "int64"),
+        ("severity", "string"), ("classification", "string"), ("transcript_ref", "string"),
+        ("status", "string"), ("created_at", "timestamp"), ("detected_at", "timestamp"),
+    ]),
+    "tool_events": (ToolEvent, [
+        ("id", "int64"), ("tenant_id", "int64"), ("agent_id", "int64"), ("tool_name", "string"),
+        ("tool_args", "string"), ("allowed", "bool"), ("timestamp", "timestamp"),
+    ]),
+}
+
+# Column each table is filtered on for the time range
+TIME_COLUMNS = {"messages": "timestamp", "incidents": "created_at", "tool_events": "timestamp"}
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+class _ChunkSink:
+    """Write-only file object that hands pyarrow's output back in chunks instead of buffering it all."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.closed = False
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportService:
+    """
+    Streams a tenant's messages, incidents or tool events for a time range.
+    Rows are read through a server-side cursor in fixed-size batches and encoded
+    batch by batch, so memory stays flat however large the export is.
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def columns(table: str) -> List[Tuple[str, str]]:
+        return EXPORT_TABLES[table][1]
+
+    async def iter_batches(self, table: str, tenant_id: int, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None, agent_id: Optional[int] = None) -> AsyncIterator[List[Tuple]]:
+        model, columns = EXPORT_TABLES[table]
+        time_column = getattr(model, TIME_COLUMNS[table])
+
+        query = select(*[getattr(model, name) for name, _ in columns]).where(model.tenant_id == tenant_id)
+        if start:
+            query = query.where(time_column >= start)
+        if end:
+            query = query.where(time_column < end)
+        if agent_id is not None:
+            query = query.where(model.agent_id == agent_id)
+        query = query.order_by(model.id).execution_options(yield_per=self.batch_size)
+
+        # Own session: the response body is produced after the request's dependencies have closed
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query)
+            async for partition in result.partitions(self.batch_size):
+                yield partition
+
+    async def stream(self, table: str, fmt: str, tenant_id: int, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, agent_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        batches = self.iter_batches(table, tenant_id, start, end, agent_id)
+        encoder = self._ndjson if fmt == "ndjson" else self._arrow
+        async for chunk in encoder(table, fmt, batches):
+            yield chunk
+        logger.info(f"Exported {table} for tenant {tenant_id} as {fmt}")
+
+    async def _ndjson(self, table: str, fmt: str, batches) -> AsyncIterator[bytes]:
+        names = [name for name, _ in self.columns(table)]
+        compressor = zlib.compressobj(wbits=31) # gzip container
+        async for batch in batches:
+            lines = "".join(json.dumps(dict(zip(names, row)), default=_json_default) + "\n" for row in batch)
+            chunk = compressor.compress(lines.encode())
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    async def _arrow(self, table: str, fmt: str, batches) -> AsyncIterator[bytes]:
+        pa, pq = _require_pyarrow()
+        columns = self.columns(table)
+        schema = pa.schema([(name, _arrow_type(pa, kind)) for name, kind in columns])
+        sink = _ChunkSink()
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        async for batch in batches:
+            arrays = []
+            for i, (name, kind) in enumerate(columns):
+                values = [row[i] for row in batch]
+                if kind == "json":
+                    values = [None if v is None else json.dumps(v, default=_json_default) for v in values]
+                arrays.append(pa.array(values, type=schema.field(name).type))
+            record_batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            # Parquet gets one row group per batch
+            writer.write_batch(record_batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+
+        writer.close()
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _arrow_type(pa, kind: str):
+    return {
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "json": pa.string(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us"),
+    }[kind]
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _require_pyarrow():
+    import pyarrow as pa
+    import pyarrow.ipc # noqa: F401
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+export_service = ExportService()
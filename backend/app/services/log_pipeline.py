@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.core.config import settings
+
+# Request-scoped tags picked up by every record emitted under the "Veridian" logger tree
+_agent_id = contextvars.ContextVar("veridian_log_agent_id", default=None)
+_tenant_id = contextvars.ContextVar("veridian_log_tenant_id", default=None)
+
+
+def bind_log_context(agent_id: Optional[int] = None, tenant_id: Optional[int] = None):
+    """Tags engine log records emitted from the current request/task with agent and tenant."""
+    if agent_id is not None:
+        _agent_id.set(agent_id)
+    if tenant_id is not None:
+        _tenant_id.set(tenant_id)
+
+
+class LogStore:
+    """
+    Bounded per-agent ring buffers for tail reads, plus a pending batch that is
+    appended to a local NDJSON store by an async flusher.
+    """
+
+    def __init__(self, buffer_size: int, max_agents: int, store_dir: str):
+        self.buffer_size = buffer_size
+        self.max_agents = max_agents
+        self.store_dir = store_dir
+        self._buffers: "OrderedDict[int, deque]" = OrderedDict()
+        self._pending: List[Dict] = []
+        self._seq = itertools.count(1)
+        # Handlers may fire from the threadpool, so guard with a thread lock
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def append(self, entry: Dict):
+        with self._lock:
+            entry["seq"] = next(self._seq)
+            agent_id = entry.get("agent_id")
+            if agent_id is not None:
+                buffer = self._buffers.get(agent_id)
+                if buffer is None:
+                    buffer = deque(maxlen=self.buffer_size)
+                    self._buffers[agent_id] = buffer
+                    if len(self._buffers) > self.max_agents:
+                        # Evict the agent that logged least recently
+                        self._buffers.popitem(last=False)
+                else:
+                    self._buffers.move_to_end(agent_id)
+                buffer.append(entry)
+            self._pending.append(entry)
+
+    def tail(self, agent_id: int, limit: int = 100, before: Optional[int] = None,
+             tenant_id: Optional[int] = None, level: Optional[str] = None) -> List[Dict]:
+        """Newest-first page of an agent's recent entries; pass the last seq seen as `before` for the next page."""
+        with self._lock:
+            buffer = self._buffers.get(agent_id)
+            entries = list(buffer) if buffer else []
+
+        page = []
+        for entry in reversed(entries):
+            if before is not None and entry["seq"] >= before:
+                continue
+            # Untagged entries belong to no tenant, so a tenant-scoped read never sees them
+            if tenant_id is not None and entry.get("tenant_id") != tenant_id:
+                continue
+            if level and entry["level"] != level.upper():
+                continue
+            page.append(entry)
+            if len(page) >= limit:
+                break
+        return page
+
+    def _drain(self) -> List[Dict]:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _write_batch(self, batch: List[Dict]):
+        os.makedirs(self.store_dir, exist_ok=True)
+        # One append-only file per UTC day
+        by_day: Dict[str, List[str]] = {}
+        for entry in batch:
+            day = entry["timestamp"][:10].replace("-", "")
+            by_day.setdefault(day, []).append(json.dumps(entry, default=str))
+        for day, lines in by_day.items():
+            path = os.path.join(self.store_dir, f"veridian-{day}.ndjson")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        batch = self._drain()
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except Exception as e:
+            # Don't route through Veridian.* or the failure would feed back into the store
+            logging.getLogger("Logs").error(f"Failed to flush {len(batch)} log records: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.LOG_FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+
+class StructuredLogHandler(logging.Handler):
+    def __init__(self, store: LogStore):
+        super().__init__(level=logging.INFO)
+        self.store = store
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.store.append({
+                "timestamp": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                "agent_id": getattr(record, "agent_id", None) or _agent_id.get(),
+                "tenant_id": getattr(record, "tenant_id", None) or _tenant_id.get(),
+            })
+        except Exception:
+            self.handleError(record)
+
+
+log_store = LogStore(
+    buffer_size=settings.LOG_BUFFER_SIZE,
+    max_agents=settings.LOG_MAX_AGENTS,
+    store_dir=settings.LOG_STORE_DIR,
+)
+
+
+def install_log_pipeline():
+    """Attaches the structured handler to the engines' logger tree (Veridian.PRE, .OSE, .AIM, .RTE, .Sandbox...)."""
+    root = logging.getLogger("Veridian")
+    if not any(isinstance(h, StructuredLogHandler) for h in root.handlers):
+        root.addHandler(StructuredLogHandler(log_store))
+    if root.level == logging.NOTSET or root.level > logging.INFO:
+        root.setLevel(logging.INFO)
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.events import AsyncSessionLocal
+from app.db.models import Incident, Remediation, Metrics, MetricsCounter, JobWatermark
+
+logger = logging.getLogger("Veridian.Metrics")
+
+COUNTER_FIELDS = (
+    "attack_count", "exploit_count", "detection_count", "detection_seconds",
+    "false_positive_count", "remediation_count", "remediation_success_count",
+)
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _pct(numerator: int, denominator: int) -> int:
+    return int(round(100 * numerator / denominator)) if denominator else 0
+
+
+def metrics_from_counters(tenant_id: int, date: datetime, c: Dict[str, int]) -> Dict:
+    return {
+        "tenant_id": tenant_id,
+        "date": date,
+        "exploit_success_rate": _pct(c["exploit_count"], c["attack_count"]),
+        "mttd": int(c["detection_seconds"] / c["detection_count"]) if c["detection_count"] else 0,
+        "fp_rate": _pct(c["false_positive_count"], c["detection_count"]),
+        "remediation_efficacy": _pct(c["remediation_success_count"], c["remediation_count"]),
+    }
+
+
+class MetricsJob:
+    """
+    Incrementally rolls Incident and Remediation rows into per-tenant per-day
+    MetricsCounter sums and the derived Metrics rows.
+    Only rows past the stored watermark are read on each run.
+    """
+
+    NAME = "metrics"
+
+    def __init__(self, batch_size: int = 5000, settle_seconds: int = 30):
+        self.batch_size = batch_size
+        # Incidents younger than this are left for the next run, so rows whose ids were
+        # allocated earlier but committed later aren't skipped by the id watermark
+        self.settle_seconds = settle_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load_watermark(self, db: AsyncSession) -> JobWatermark:
+        query = select(JobWatermark).where(JobWatermark.name == self.NAME).with_for_update()
+        watermark = (await db.execute(query)).scalars().first()
+        if watermark is None:
+            # Two workers can both find the row missing; the loser's insert is a no-op
+            if db.bind.dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            await db.execute(insert(JobWatermark).values(
+                name=self.NAME, position={"incident_id": 0, "remediation_id": 0}, version=0
+            ).on_conflict_do_nothing(index_elements=[JobWatermark.name]))
+            await db.commit()
+            watermark = (await db.execute(query)).scalars().one()
+        return watermark
+
+    async def _collect_incidents(self, db: AsyncSession, after_id: int, deltas) -> Tuple[int, int]:
+        settled_before = datetime.utcnow() - timedelta(seconds=self.settle_seconds)
+        rows = (await db.execute(
+            select(
+                Incident.id, Incident.tenant_id, Incident.campaign_id, Incident.classification,
+                Incident.created_at, Incident.detected_at
+            ).where(Incident.id > after_id).order_by(Incident.id).limit(self.batch_size)
+        )).all()
+
+        last_id = after_id
+        for incident_id, tenant_id, campaign_id, classification, created_at, detected_at in rows:
+            if created_at and created_at >= settled_before:
+                break
+            day = _day(created_at or datetime.utcnow())
+            counters = deltas[(tenant_id, day)]
+            if campaign_id is not None:
+                counters["attack_count"] += 1
+                if classification == "vulnerability_found":
+                    counters["exploit_count"] += 1
+            else:
+                counters["detection_count"] += 1
+                if created_at and detected_at:
+                    counters["detection_seconds"] += max(0, int((detected_at - created_at).total_seconds()))
+            last_id = incident_id
+        return last_id, len(rows)
+
+    async def _collect_remediations(self, db: AsyncSession, after_id: int, deltas) -> Tuple[int, int]:
+        rows = (await db.execute(
+            select(Remediation.id, Remediation.result, Incident.tenant_id, Incident.campaign_id, Incident.created_at)
+            .join(Incident, Remediation.incident_id == Incident.id)
+            .where(Remediation.id > after_id)
+            .order_by(Remediation.id).limit(self.batch_size)
+        )).all()
+
+        last_id = after_id
+        for remediation_id, result, tenant_id, campaign_id, created_at in rows:
+            # Attributed to the day of the incident being remediated
+            counters = deltas[(tenant_id, _day(created_at or datetime.utcnow()))]
+            if result == "false_positive":
+                # fp_rate is over detections, which leave out campaign incidents
+                if campaign_id is None:
+                    counters["false_positive_count"] += 1
+            else:
+                counters["remediation_count"] += 1
+                if result == "success":
+                    counters["remediation_success_count"] += 1
+            last_id = remediation_id
+        return last_id, len(rows)
+
+    async def _apply(self, db: AsyncSession, deltas):
+        for (tenant_id, day), delta in deltas.items():
+            row = await db.get(MetricsCounter, (tenant_id, day))
+            if row is None:
+                row = MetricsCounter(tenant_id=tenant_id, date=day, **{f: 0 for f in COUNTER_FIELDS})
+                db.add(row)
+            for field, value in delta.items():
+                setattr(row, field, (getattr(row, field) or 0) + value)
+
+            values = metrics_from_counters(tenant_id, day, {f: getattr(row, f) or 0 for f in COUNTER_FIELDS})
+            metrics = await db.get(Metrics, (tenant_id, day))
+            if metrics is None:
+                db.add(Metrics(**values))
+            else:
+                for field, value in values.items():
+                    setattr(metrics, field, value)
+
+    async def run_once(self) -> int:
+        """Processes one batch past the watermark. Returns the size of the largest batch read."""
+        async with AsyncSessionLocal() as db:
+            watermark = await self._load_watermark(db)
+            position = dict(watermark.position or {})
+            version = watermark.version
+
+            deltas = defaultdict(lambda: defaultdict(int))
+            incident_id, incident_rows = await self._collect_incidents(db, position.get("incident_id", 0), deltas)
+            remediation_id, remediation_rows = await self._collect_remediations(
+                db, position.get("remediation_id", 0), deltas
+            )
+            if not deltas:
+                return 0
+
+            await self._apply(db, deltas)
+
+            # Compare-and-set so two workers running the job can't both apply the same batch
+            result = await db.execute(
+                update(JobWatermark)
+                .where(JobWatermark.name == self.NAME, JobWatermark.version == version)
+                .values(
+                    position={"incident_id": incident_id, "remediation_id": remediation_id},
+                    version=version + 1,
+                    updated_at=datetime.utcnow()
+                )
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                logger.info("Metrics batch already applied by another worker")
+                return 0
+
+            await db.commit()
+            logger.info(f"Rolled up {len(deltas)} tenant-day(s) up to incident {incident_id}, remediation {remediation_id}")
+            return max(incident_rows, remediation_rows)
+
+    async def run(self):
+        """Drains everything past the watermark."""
+        while await self.run_once() >= self.batch_size:
+            pass
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Metrics job failed: {e}")
+            await asyncio.sleep(settings.METRICS_JOB_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+metrics_job = MetricsJob()
+
+if __name__ == "__main__":
+    asyncio.run(metrics_job.run())
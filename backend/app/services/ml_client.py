@@ -1,4 +1,10 @@
 from app.engines.sdk import sdk
+from app.engines.drift import drift_engine
+
+# Drift is 0.5*JSD + 0.25*rate + 0.25*out-of-allowlist share (DriftEngine.WEIGHTS), so no single
+# component can pass 0.5 alone; 0.6 takes a large shift in the tool mix plus unusual volume or
+# disallowed tools, while 0.8 would need all three near their maximum at once
+ANOMALY_THRESHOLD = 0.6
 
 class MLClient:
     def evaluate_message(self, content: str):
@@ -25,13 +31,12 @@ class MLClient:
         }
 
     def detect_anomaly(self, features: dict):
-        # Placeholder for future AIM integration if needed
-        # For now, keep dummy or remove if unused
-        import random
-        score = random.random()
+        # Autonomy drift of the agent's recent tool usage (see app.engines.drift)
+        agent_id = features.get("agent_id")
+        score = drift_engine.current(agent_id) if agent_id is not None else 0.0
         return {
             "anomaly_score": score,
-            "is_anomaly": score > 0.8
+            "is_anomaly": score > ANOMALY_THRESHOLD
         }
 
 ml_client = MLClient()
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.db.events import AsyncSessionLocal
+from app.db.models import AttackCorpusEntry
+
+logger = logging.getLogger("Veridian.RedTeam")
+
+
+def intent_hash(intent: str) -> str:
+    # Case and whitespace don't make a different intent
+    return hashlib.sha256(" ".join(intent.lower().split()).encode()).hexdigest()
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.strip().encode()).hexdigest()
+
+
+@dataclass
+class Outcome:
+    """One use of an attack prompt, to be folded into the corpus."""
+    tenant_id: int
+    intent: str
+    attack_type: str
+    prompt: str
+    success: bool
+    corpus_id: Optional[int] = None
+    mutator_chain: str = ""
+    source: str = "rts"
+
+
+class AttackCorpus:
+    """
+    Per-tenant store of generated attack prompts, keyed by (intent hash, attack type, mutator chain)
+    and deduplicated on the prompt text. Campaigns draw from it before asking the LLM for more, best
+    prior success rate first, so a regression campaign re-runs known attacks with no generation calls.
+    """
+
+    @staticmethod
+    def _success_rate():
+        # Posterior mean under a uniform prior: unseen prompts start at 0.5
+        return (AttackCorpusEntry.successes + 1.0) / (AttackCorpusEntry.uses + 2.0)
+
+    async def draw(self, db: AsyncSession, tenant_id: int, intent: str, attack_type: str,
+                   count: int, mutator_chain: str = "") -> List[AttackCorpusEntry]:
+        """Up to `count` stored prompts for the key, highest-yield first."""
+        if count <= 0:
+            return []
+        return list((await db.execute(
+            select(AttackCorpusEntry)
+            .where(
+                AttackCorpusEntry.tenant_id == tenant_id,
+                AttackCorpusEntry.intent_hash == intent_hash(intent),
+                AttackCorpusEntry.attack_type == attack_type,
+                AttackCorpusEntry.mutator_chain == mutator_chain
+            )
+            .order_by(self._success_rate().desc(), AttackCorpusEntry.id)
+            .limit(count)
+        )).scalars().all())
+
+    async def draw_plan(self, db: AsyncSession, tenant_id: int,
+                        needed: Dict[Tuple[str, str, str], int]) -> Dict[Tuple[str, str, str], List[AttackCorpusEntry]]:
+        """draw() for every (intent, attack_type, mutator_chain) a campaign needs prompts for."""
+        return {
+            (intent, attack_type, chain): await self.draw(db, tenant_id, intent, attack_type, count, mutator_chain=chain)
+            for (intent, attack_type, chain), count in needed.items()
+        }
+
+    async def add(self, db: AsyncSession, tenant_id: int, intent: str, attack_type: str, prompts: Iterable[str],
+                  source: str = "generator", mutator_chain: str = "") -> List[AttackCorpusEntry]:
+        """Stores new prompts (duplicates of stored ones are skipped) and returns the entries for all of them."""
+        key = (tenant_id, intent_hash(intent), attack_type, mutator_chain)
+        by_hash = {prompt_hash(p): p.strip() for p in prompts if p and p.strip() and not p.startswith("[ERROR")}
+        entries = await self._existing(db, key, by_hash)
+        for digest, prompt in by_hash.items():
+            if digest in entries:
+                continue
+            entry = AttackCorpusEntry(
+                tenant_id=tenant_id, intent_hash=key[1], attack_type=attack_type, mutator_chain=mutator_chain,
+                prompt_hash=digest, prompt=prompt, source=source, uses=0, successes=0
+            )
+            try:
+                async with db.begin_nested():
+                    db.add(entry)
+            except IntegrityError:
+                # Another worker stored the same prompt first
+                entry = (await self._existing(db, key, {digest: prompt}))[digest]
+            entries[digest] = entry
+        await db.commit()
+        return [entries[digest] for digest in by_hash]
+
+    @staticmethod
+    async def _existing(db: AsyncSession, key, by_hash: Dict[str, str]) -> Dict[str, AttackCorpusEntry]:
+        if not by_hash:
+            return {}
+        tenant_id, intent_digest, attack_type, mutator_chain = key
+        rows = (await db.execute(
+            select(AttackCorpusEntry).where(
+                AttackCorpusEntry.tenant_id == tenant_id,
+                AttackCorpusEntry.intent_hash == intent_digest,
+                AttackCorpusEntry.attack_type == attack_type,
+                AttackCorpusEntry.mutator_chain == mutator_chain,
+                AttackCorpusEntry.prompt_hash.in_(list(by_hash))
+            )
+        )).scalars().all()
+        return {row.prompt_hash: row for row in rows}
+
+    async def record(self, outcomes: List[Outcome]):
+        """Adds freshly generated prompts and updates use/success counts, in one transaction of its own."""
+        if not outcomes:
+            return
+        async with AsyncSessionLocal() as db:
+            fresh: Dict[Tuple, List[Outcome]] = {}
+            for outcome in outcomes:
+                if outcome.corpus_id is None:
+                    fresh.setdefault(
+                        (outcome.tenant_id, outcome.intent, outcome.attack_type, outcome.mutator_chain, outcome.source), []
+                    ).append(outcome)
+            for (tenant_id, intent, attack_type, mutator_chain, source), group in fresh.items():
+                entries = await self.add(db, tenant_id, intent, attack_type, [o.prompt for o in group],
+                                         source=source, mutator_chain=mutator_chain)
+                ids = {entry.prompt_hash: entry.id for entry in entries}
+                for outcome in group:
+                    outcome.corpus_id = ids.get(prompt_hash(outcome.prompt))
+
+            counts: Dict[int, List[int]] = {}
+            for outcome in outcomes:
+                if outcome.corpus_id is not None:
+                    uses_successes = counts.setdefault(outcome.corpus_id, [0, 0])
+                    uses_successes[0] += 1
+                    uses_successes[1] += int(outcome.success)
+            now = datetime.utcnow()
+            for corpus_id, (uses, successes) in counts.items():
+                # Increment in SQL so concurrent campaigns don't overwrite each other's counts
+                await db.execute(
+                    update(AttackCorpusEntry).where(AttackCorpusEntry.id == corpus_id).values(
+                        uses=AttackCorpusEntry.uses + uses,
+                        successes=AttackCorpusEntry.successes + successes,
+                        last_used_at=now
+                    )
+                )
+            await db.commit()
+
+
+attack_corpus = AttackCorpus()
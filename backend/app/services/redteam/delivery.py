@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update, or_, and_
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.core.state import state, StateBackend
+from app.db.events import AsyncSessionLocal
+from app.db.models import AttackDelivery
+
+logger = logging.getLogger("Veridian.RedTeam")
+
+OPEN = ("pending", "delivered")
+
+
+class AttackInbox:
+    """
+    Per-agent attack queue for SDK-mode agents, kept in the attack_deliveries table.
+
+    A campaign probe enqueues the payload and waits for the answer. Agents long-poll fetch():
+    a poll with nothing to hand out sleeps until an enqueue for that agent wakes it (across
+    workers through the state backend's event log when it is shared), so idle agents cost
+    no queries. Fetched attacks that go unanswered are handed out again after the visibility
+    timeout; unanswered ones expire after the response timeout.
+    """
+
+    CHANNEL = "attack-deliveries"
+    RELAY_INTERVAL = 0.25 # seconds
+    COLLECT_INTERVAL = 1.0 # how often waiting probes check for answers posted to other workers
+    RECHECK_SECONDS = 5 # long-poll re-check when wakeups can't cross workers (memory backend)
+    CHUNK = 500
+
+    def __init__(self, backend: StateBackend, response_timeout: float = 300,
+                 visibility_seconds: float = 60, max_wait: float = 30):
+        self.backend = backend
+        self.response_timeout = response_timeout
+        self.visibility_seconds = visibility_seconds
+        self.max_wait = max_wait
+        self._wakeups: Dict[int, asyncio.Event] = {}
+        self._answers: Dict[int, asyncio.Future] = {}
+        self._inserts: List[Tuple[AttackDelivery, asyncio.Future]] = []
+        self._insert_task: Optional[asyncio.Task] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._relay_task: Optional[asyncio.Task] = None
+        self._cursor: Optional[str] = None
+
+    # Producer side (campaign runs)
+
+    async def enqueue(self, tenant_id: int, agent_id: int, payload: str,
+                      campaign_id: Optional[int] = None, attack_index: Optional[int] = None) -> int:
+        """Queues a payload for the agent and returns the delivery id. Concurrent calls share one commit."""
+        delivery = AttackDelivery(
+            tenant_id=tenant_id, agent_id=agent_id, campaign_id=campaign_id, attack_index=attack_index,
+            payload=payload, status="pending", attempts=0,
+            expires_at=datetime.utcnow() + timedelta(seconds=self.response_timeout)
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._inserts.append((delivery, future))
+        if self._insert_task is None:
+            self._insert_task = asyncio.create_task(self._insert_batch())
+        return await future
+
+    async def _insert_batch(self):
+        await asyncio.sleep(0) # let the other probes of this attack join the batch
+        batch, self._inserts = self._inserts, []
+        self._insert_task = None
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([delivery for delivery, _ in batch])
+                await db.commit()
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        agent_ids = sorted({delivery.agent_id for delivery, _ in batch})
+        for agent_id in agent_ids:
+            self._notify(agent_id)
+        if self.backend.shared:
+            try:
+                await self.backend.append_event(self.CHANNEL, json.dumps(agent_ids))
+            except Exception as e:
+                logger.warning(f"Failed to announce attack deliveries: {e}")
+        for delivery, future in batch:
+            if not future.done():
+                future.set_result(delivery.id)
+
+    async def request(self, tenant_id: int, agent_id: int, payload: str,
+                      campaign_id: Optional[int] = None, attack_index: Optional[int] = None) -> Optional[str]:
+        """Queues a payload and waits for the agent's response; None if it expired unanswered."""
+        delivery_id = await self.enqueue(tenant_id, agent_id, payload, campaign_id, attack_index)
+        future = asyncio.get_running_loop().create_future()
+        self._answers[delivery_id] = future
+        if self._collector is None:
+            self._collector = asyncio.create_task(self._collect())
+        try:
+            # The collector expires it at response_timeout; the margin covers a collector stall
+            return await asyncio.wait_for(future, self.response_timeout + 5 * self.COLLECT_INTERVAL)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._answers.pop(delivery_id, None)
+
+    async def _collect(self):
+        """Resolves waiting probes whose answers were posted to other workers, and expires overdue ones."""
+        try:
+            while self._answers:
+                await asyncio.sleep(self.COLLECT_INTERVAL)
+                try:
+                    await self._collect_once()
+                except Exception as e:
+                    logger.warning(f"Attack delivery collection failed: {e}")
+        finally:
+            self._collector = None
+
+    async def _collect_once(self):
+        ids = list(self._answers)
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(ids), self.CHUNK):
+                chunk = ids[start:start + self.CHUNK]
+                await db.execute(
+                    update(AttackDelivery)
+                    .where(AttackDelivery.id.in_(chunk), AttackDelivery.status.in_(OPEN), AttackDelivery.expires_at < now)
+                    .values(status="expired")
+                )
+                await db.commit()
+                rows = (await db.execute(
+                    select(AttackDelivery.id, AttackDelivery.status, AttackDelivery.response)
+                    .where(AttackDelivery.id.in_(chunk), AttackDelivery.status.in_(("answered", "expired")))
+                )).all()
+                for delivery_id, status, response in rows:
+                    self._resolve(delivery_id, response if status == "answered" else None)
+
+    def _resolve(self, delivery_id: int, response: Optional[str]):
+        future = self._answers.pop(delivery_id, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    async def expire_campaign(self, campaign_id: int):
+        """Drops a finished or cancelled campaign's attacks that no agent has answered yet."""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(AttackDelivery)
+                .where(AttackDelivery.campaign_id == campaign_id, AttackDelivery.status.in_(OPEN))
+                .values(status="expired")
+            )
+            await db.commit()
+
+    # Agent side
+
+    def _notify(self, agent_id: int):
+        event = self._wakeups.pop(agent_id, None)
+        if event is not None:
+            event.set()
+
+    async def _claim(self, agent_id: int, limit: int) -> List[AttackDelivery]:
+        now = datetime.utcnow()
+        claimable = and_(
+            AttackDelivery.agent_id == agent_id,
+            AttackDelivery.expires_at > now,
+            or_(
+                AttackDelivery.status == "pending",
+                and_(AttackDelivery.status == "delivered", AttackDelivery.visible_at < now)
+            )
+        )
+        async with AsyncSessionLocal() as db:
+            ids = list((await db.execute(
+                select(AttackDelivery.id).where(claimable).order_by(AttackDelivery.id).limit(limit)
+            )).scalars())
+            if not ids:
+                return []
+            # Conditional update, so two polls for the same agent never get the same attack
+            token = uuid.uuid4().hex
+            await db.execute(
+                update(AttackDelivery)
+                .where(AttackDelivery.id.in_(ids), claimable)
+                .values(
+                    status="delivered", claim_token=token, attempts=AttackDelivery.attempts + 1,
+                    visible_at=now + timedelta(seconds=self.visibility_seconds)
+                )
+            )
+            await db.commit()
+            return list((await db.execute(
+                select(AttackDelivery).where(AttackDelivery.claim_token == token).order_by(AttackDelivery.id)
+            )).scalars().all())
+
+    async def fetch(self, agent_id: int, limit: int = 10, wait: float = 0) -> List[AttackDelivery]:
+        """Up to `limit` attacks for the agent, waiting up to `wait` seconds for one to be queued."""
+        deadline = time.monotonic() + min(wait, self.max_wait)
+        while True:
+            event = self._wakeups.setdefault(agent_id, asyncio.Event())
+            batch = await self._claim(agent_id, limit)
+            remaining = deadline - time.monotonic()
+            if batch or remaining <= 0:
+                return batch
+            step = remaining if self.backend.shared else min(remaining, self.RECHECK_SECONDS)
+            try:
+                await asyncio.wait_for(event.wait(), step)
+            except asyncio.TimeoutError:
+                pass
+
+    async def answer(self, agent_id: int, responses: Dict[int, str]) -> List[int]:
+        """Stores the agent's responses to attacks it fetched; returns the delivery ids accepted."""
+        accepted = []
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            for delivery_id, response in responses.items():
+                result = await db.execute(
+                    update(AttackDelivery)
+                    .where(
+                        AttackDelivery.id == delivery_id,
+                        AttackDelivery.agent_id == agent_id,
+                        AttackDelivery.status == "delivered"
+                    )
+                    .values(status="answered", response=response, answered_at=now)
+                )
+                if result.rowcount == 1:
+                    accepted.append(delivery_id)
+            await db.commit()
+        # Probes waiting in this worker get the answer now; others pick it up on their next collect
+        for delivery_id in accepted:
+            self._resolve(delivery_id, responses[delivery_id])
+        return accepted
+
+    # Cross-worker wakeups
+
+    async def relay_once(self):
+        for entry_id, data in await self.backend.read_events(self.CHANNEL, self._cursor):
+            self._cursor = entry_id
+            for agent_id in json.loads(data):
+                self._notify(agent_id)
+
+    async def _relay(self):
+        self._cursor = await self.backend.last_event_id(self.CHANNEL)
+        while True:
+            await asyncio.sleep(self.RELAY_INTERVAL)
+            try:
+                await self.relay_once()
+            except Exception as e:
+                logger.warning(f"Attack delivery relay failed: {e}")
+
+    def start(self):
+        if self.backend.shared and self._relay_task is None:
+            self._relay_task = asyncio.create_task(self._relay())
+
+    def stop(self):
+        if self._relay_task is not None:
+            self._relay_task.cancel()
+            self._relay_task = None
+
+
+attack_inbox = AttackInbox(
+    state,
+    response_timeout=settings.REDTEAM_SDK_RESPONSE_TIMEOUT,
+    visibility_seconds=settings.REDTEAM_SDK_VISIBILITY_SECONDS,
+    max_wait=settings.REDTEAM_SDK_MAX_WAIT
+)
@@ -1,4 +1,8 @@
+import asyncio
+from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.engines.llm import llm_engine
+from app.services.redteam.corpus import attack_corpus
 
 class AttackGenerator:
     def generate_attacks(self, template: str, count: int = 3):
@@ -20,4 +24,17 @@ class AttackGenerator:
                 
         return attacks[:count]
 
+    async def variants(self, db: AsyncSession, tenant_id: int, template: str, count: int = 3) -> List[str]:
+        """generate_attacks() through the attack corpus: stored variants first, the LLM only for the shortfall."""
+        entries = await attack_corpus.draw(db, tenant_id, template, "variant", count)
+        prompts = [entry.prompt for entry in entries]
+        if len(prompts) < count:
+            generated = await asyncio.to_thread(self.generate_attacks, template, count - len(prompts))
+            fallback = generated and generated[0] == f"{template} variant 0"
+            if not fallback:
+                # Canned fallbacks aren't worth keeping; real variants are stored (deduplicated)
+                await attack_corpus.add(db, tenant_id, template, "variant", generated, source="generator")
+            prompts += [g for g in generated if g not in prompts]
+        return prompts[:count]
+
 generator = AttackGenerator()
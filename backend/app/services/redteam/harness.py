@@ -1,6 +1,7 @@
 import httpx
 import asyncio
 from typing import Optional
+from app.services.redteam.delivery import attack_inbox
 
 class AttackHarness:
     async def run_attack_url(self, target_url: str, payload: str) -> str:
@@ -11,10 +12,8 @@ class AttackHarness:
             except Exception as e:
                 return f"Error: {str(e)}"
 
-    async def queue_attack_sdk(self, agent_id: int, payload: str):
-        # In a real system, this would push to a queue (Redis/RabbitMQ)
-        # For now, we just log it
-        print(f"Queued SDK attack for agent {agent_id}: {payload}")
-        return "Queued"
+    async def queue_attack_sdk(self, agent_id: int, payload: str, tenant_id: int, campaign_id: Optional[int] = None) -> int:
+        # Queued in the agent's delivery queue; the agent fetches it by long-poll. Returns the delivery id
+        return await attack_inbox.enqueue(tenant_id, agent_id, payload, campaign_id=campaign_id)
 
 harness = AttackHarness()
@@ -0,0 +1,188 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("Veridian.Search")
+
+# Postgres: expression GIN indexes over the tsvector of each searchable column,
+# so no extra column or trigger has to be kept in sync.
+POSTGRES_DOCUMENTS = {
+    "messages": "to_tsvector('english', coalesce(payload->>'content', ''))",
+    "incidents": "to_tsvector('english', coalesce(transcript_ref, ''))",
+}
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_messages_content_fts ON messages USING GIN ({POSTGRES_DOCUMENTS['messages']})",
+    f"CREATE INDEX IF NOT EXISTS ix_incidents_transcript_fts ON incidents USING GIN ({POSTGRES_DOCUMENTS['incidents']})",
+]
+
+# SQLite: FTS5 shadow tables keyed by the source rowid, kept in sync by triggers.
+SQLITE_FTS_TABLES = {
+    "messages_fts": {
+        "source": "messages",
+        "document": "json_extract({row}.payload, '$.content')",
+        "watch": "payload",
+    },
+    "incidents_fts": {
+        "source": "incidents",
+        "document": "{row}.transcript_ref",
+        "watch": "transcript_ref",
+    },
+}
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+
+def _sqlite_ddl(fts_table: str, spec: Dict[str, str]) -> List[str]:
+    source = spec["source"]
+    new_doc = spec["document"].format(row="new")
+    return [
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5(body, tokenize='porter unicode61')",
+        f"INSERT INTO {fts_table}(rowid, body) SELECT id, {spec['document'].format(row=source)} FROM {source}",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN
+            INSERT INTO {fts_table}(rowid, body) VALUES (new.id, {new_doc});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN
+            DELETE FROM {fts_table} WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {spec['watch']} ON {source} BEGIN
+            DELETE FROM {fts_table} WHERE rowid = old.id;
+            INSERT INTO {fts_table}(rowid, body) VALUES (new.id, {new_doc});
+        END""",
+    ]
+
+
+def ensure_search_indexes(conn):
+    """Creates the full-text indexes for the active dialect. Runs inside init_db via run_sync."""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRES_DDL:
+            conn.exec_driver_sql(statement)
+    elif dialect == "sqlite":
+        existing = {
+            row[0] for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        for fts_table, spec in SQLITE_FTS_TABLES.items():
+            if fts_table in existing:
+                continue
+            # Create + backfill only once; the triggers keep it current afterwards
+            for statement in _sqlite_ddl(fts_table, spec):
+                conn.exec_driver_sql(statement)
+            logger.info(f"Created FTS5 index {fts_table}")
+    else:
+        logger.warning(f"Full-text search is not supported on dialect '{dialect}'")
+
+
+def _sqlite_match_expression(query: str) -> str:
+    # Quote every term so user input can't use FTS5 operators; adjacent quoted
+    # terms form a phrase query, which is what investigators search for.
+    terms = [term.replace('"', '""') for term in query.split()]
+    return '"' + " ".join(terms) + '"'
+
+
+class SearchService:
+    SOURCES = ("messages", "incidents")
+
+    def _filters(self, alias: str, time_column: str, agent_id, since, until) -> str:
+        clauses = [f"{alias}.tenant_id = :tenant_id"]
+        if agent_id is not None:
+            clauses.append(f"{alias}.agent_id = :agent_id")
+        if since is not None:
+            clauses.append(f"{alias}.{time_column} >= :since")
+        if until is not None:
+            clauses.append(f"{alias}.{time_column} < :until")
+        return " AND ".join(clauses)
+
+    def _postgres_query(self, source: str, filters: str) -> str:
+        document = POSTGRES_DOCUMENTS[source]
+        if source == "messages":
+            body = "coalesce(s.payload->>'content', '')"
+            columns = "s.id, s.agent_id, s.timestamp AS ts, s.decision AS label"
+        else:
+            body = "coalesce(s.transcript_ref, '')"
+            columns = "s.id, s.agent_id, s.created_at AS ts, s.classification AS label"
+        headline_opts = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=35, MinWords=10"
+        return f"""
+            SELECT {columns},
+                   ts_headline('english', {body}, q, '{headline_opts}') AS snippet,
+                   ts_rank({document}, q) AS rank
+            FROM {source} s, phraseto_tsquery('english', :query) q
+            WHERE {document} @@ q AND {filters}
+            ORDER BY rank DESC, ts DESC
+            LIMIT :window
+        """
+
+    def _sqlite_query(self, source: str, filters: str) -> str:
+        fts_table = f"{source}_fts"
+        if source == "messages":
+            columns = "s.id, s.agent_id, s.timestamp AS ts, s.decision AS label"
+        else:
+            columns = "s.id, s.agent_id, s.created_at AS ts, s.classification AS label"
+        # bm25() is "lower is better"; negate so both dialects sort rank DESC
+        return f"""
+            SELECT {columns},
+                   snippet({fts_table}, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16) AS snippet,
+                   -bm25({fts_table}) AS rank
+            FROM {fts_table} JOIN {source} s ON s.id = {fts_table}.rowid
+            WHERE {fts_table} MATCH :query AND {filters}
+            ORDER BY rank DESC, ts DESC
+            LIMIT :window
+        """
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        tenant_id: int,
+        agent_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        sources: tuple = SOURCES,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> List[Dict]:
+        """Ranked full-text search over message payloads and incident transcripts."""
+        dialect = db.bind.dialect.name
+        if dialect not in ("postgresql", "sqlite"):
+            raise NotImplementedError(f"Full-text search is not supported on dialect '{dialect}'")
+
+        params = {
+            "query": _sqlite_match_expression(query) if dialect == "sqlite" else query,
+            "tenant_id": tenant_id,
+            "agent_id": agent_id,
+            "since": since,
+            "until": until,
+            # Each source contributes at most offset+limit rows to the merged page
+            "window": offset + limit,
+        }
+
+        hits = []
+        for source in sources:
+            time_column = "timestamp" if source == "messages" else "created_at"
+            filters = self._filters("s", time_column, agent_id, since, until)
+            sql = self._postgres_query(source, filters) if dialect == "postgresql" else self._sqlite_query(source, filters)
+            used = {k: v for k, v in params.items() if f":{k}" in sql}
+            rows = (await db.execute(text(sql), used)).all()
+            for row in rows:
+                ts = row.ts
+                if isinstance(ts, str):
+                    ts = datetime.fromisoformat(ts)
+                hits.append({
+                    "source": source,
+                    "id": row.id,
+                    "agent_id": row.agent_id,
+                    "timestamp": ts.isoformat() if ts else None,
+                    "label": row.label,
+                    "snippet": row.snippet,
+                    "rank": float(row.rank or 0.0),
+                })
+
+        hits.sort(key=lambda h: (h["rank"], h["timestamp"] or ""), reverse=True)
+        return hits[offset:offset + limit]
+
+search_service = SearchService()
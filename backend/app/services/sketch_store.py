@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.events import AsyncSessionLocal
+from app.db.models import AgentSketch
+from app.engines.sketches import AgentSketches
+from app.services.threat_counter import UNSAFE_DECISIONS
+
+logger = logging.getLogger("Veridian.Sketches")
+
+PERIOD_HOURS = {"1h": 1, "24h": 24, "7d": 168}
+
+_WORD = re.compile(r"[a-z0-9']+")
+MAX_PHRASE_WORDS = 200
+MAX_ITEM_LENGTH = 256
+
+
+def _phrases(text: str) -> Set[str]:
+    """Word trigrams of a prompt (the whole prompt if it is shorter), each counted once per message."""
+    words = _WORD.findall(text.lower())[:MAX_PHRASE_WORDS]
+    if len(words) < 3:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _tool_arg_key(tool_name: Optional[str], args) -> str:
+    if not isinstance(args, str):
+        args = json.dumps(args, sort_keys=True, default=str)
+    return f"{tool_name or 'unknown'}:{args}"[:MAX_ITEM_LENGTH]
+
+
+class SketchStore:
+    """
+    Per-agent hourly sketches of prompts, attack phrases and tool arguments.
+
+    Each worker updates its own windows in memory and periodically writes them to
+    agent_sketches under its own worker_id, so workers never overwrite each other.
+    Reads merge every worker's persisted windows (reloaded every SKETCH_SYNC_SECONDS)
+    with this worker's unflushed ones.
+    """
+
+    def __init__(self, retention_hours: int = 168, sync_seconds: float = 60, max_agents: int = 256):
+        self.retention_hours = retention_hours
+        self.sync_seconds = sync_seconds
+        self.max_agents = max_agents
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # agent_id -> {hour: sketches} written by this worker and not yet evicted
+        self._live: Dict[int, Dict[int, AgentSketches]] = {}
+        self._dirty: Set[Tuple[int, int]] = set()
+        self._versions: Dict[int, int] = {}
+        # agent_id -> (loaded_at, {hour: sketches merged across workers}), LRU by read
+        self._history: "OrderedDict[int, Tuple[float, Dict[int, AgentSketches]]]" = OrderedDict()
+        # (agent_id, hours) -> (key, merged sketches)
+        self._merged: Dict[Tuple[int, int], Tuple[tuple, AgentSketches]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _hour(ts: Optional[float] = None) -> int:
+        return int((ts if ts is not None else time.time()) // 3600)
+
+    def _window(self, agent_id: int) -> AgentSketches:
+        hour = self._hour()
+        windows = self._live.setdefault(agent_id, {})
+        sketches = windows.get(hour)
+        if sketches is None:
+            sketches = windows[hour] = AgentSketches()
+        self._dirty.add((agent_id, hour))
+        self._versions[agent_id] = self._versions.get(agent_id, 0) + 1
+        return sketches
+
+    def record_prompt(self, agent_id: int, text: str, decision: str):
+        """Counts a user prompt; blocked or flagged prompts also feed the attack-phrase sketches."""
+        if not text:
+            return
+        with self._lock:
+            sketches = self._window(agent_id)
+            sketches.prompts.add(" ".join(text.lower().split()))
+            if decision in UNSAFE_DECISIONS:
+                for phrase in _phrases(text):
+                    sketches.phrases.add(phrase)
+                    sketches.phrase_counts.add(phrase)
+
+    def record_tool_call(self, agent_id: int, tool_name: Optional[str], args):
+        key = _tool_arg_key(tool_name, args)
+        with self._lock:
+            sketches = self._window(agent_id)
+            sketches.tool_args.add(key)
+            sketches.tool_arg_counts.add(key)
+
+    async def _load_history(self, db: AsyncSession, agent_id: int):
+        with self._lock:
+            entry = self._history.get(agent_id)
+            if entry is not None and time.monotonic() - entry[0] < self.sync_seconds:
+                self._history.move_to_end(agent_id)
+                return
+            live_hours = set(self._live.get(agent_id, {}))
+
+        since = datetime.utcfromtimestamp((self._hour() - self.retention_hours + 1) * 3600)
+        rows = (await db.execute(
+            select(AgentSketch.window_start, AgentSketch.worker_id, AgentSketch.data).where(
+                AgentSketch.agent_id == agent_id,
+                AgentSketch.window_start >= since
+            )
+        )).all()
+
+        history: Dict[int, AgentSketches] = {}
+        for window_start, worker_id, data in rows:
+            hour = int((window_start - datetime(1970, 1, 1)).total_seconds() // 3600)
+            # This worker's live windows are merged from memory instead
+            if worker_id == self.worker_id and hour in live_hours:
+                continue
+            sketches = AgentSketches.from_bytes(data)
+            if hour in history:
+                history[hour].merge(sketches)
+            else:
+                history[hour] = sketches
+
+        with self._lock:
+            self._history[agent_id] = (time.monotonic(), history)
+            self._history.move_to_end(agent_id)
+            while len(self._history) > self.max_agents:
+                evicted, _ = self._history.popitem(last=False)
+                for key in [k for k in self._merged if k[0] == evicted]:
+                    del self._merged[key]
+
+    async def window(self, db: AsyncSession, agent_id: int, hours: int) -> AgentSketches:
+        """All sketches for an agent merged over the last `hours` hours, across windows and workers."""
+        await self._load_history(db, agent_id)
+        current = self._hour()
+        first = current - hours + 1
+        with self._lock:
+            loaded_at, history = self._history[agent_id]
+            key = (self._versions.get(agent_id, 0), loaded_at, current)
+            cached = self._merged.get((agent_id, hours))
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+            merged = AgentSketches()
+            for hour, sketches in history.items():
+                if hour >= first:
+                    merged.merge(sketches)
+            for hour, sketches in self._live.get(agent_id, {}).items():
+                if hour >= first:
+                    merged.merge(sketches)
+            self._merged[(agent_id, hours)] = (key, merged)
+            return merged
+
+    async def flush(self):
+        """Writes this worker's changed windows, evicts closed ones from memory and prunes expired rows."""
+        with self._lock:
+            dirty = list(self._dirty)
+            self._dirty.clear()
+            snapshot = {(agent_id, hour): self._live[agent_id][hour].to_bytes() for agent_id, hour in dirty}
+
+        try:
+            async with AsyncSessionLocal() as db:
+                for (agent_id, hour), data in snapshot.items():
+                    window_start = datetime.utcfromtimestamp(hour * 3600)
+                    row = await db.get(AgentSketch, (agent_id, window_start, self.worker_id))
+                    if row is None:
+                        db.add(AgentSketch(
+                            agent_id=agent_id, window_start=window_start, worker_id=self.worker_id,
+                            data=data, updated_at=datetime.utcnow()
+                        ))
+                    else:
+                        row.data = data
+                        row.updated_at = datetime.utcnow()
+                cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+                await db.execute(delete(AgentSketch).where(AgentSketch.window_start < cutoff))
+                await db.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(snapshot)
+            raise
+
+        # Closed windows are now persisted; reads pick them up from the DB from here on
+        current = self._hour()
+        with self._lock:
+            for agent_id in list(self._live):
+                windows = self._live[agent_id]
+                closed = [h for h in windows if h < current and (agent_id, h) not in self._dirty]
+                for hour in closed:
+                    del windows[hour]
+                if closed:
+                    self._history.pop(agent_id, None)
+                if not windows:
+                    del self._live[agent_id]
+        if snapshot:
+            logger.info(f"Flushed {len(snapshot)} sketch window(s)")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(settings.SKETCH_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Sketch flush failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final sketch flush failed: {e}")
+
+
+def distinct_prompts(sketches: AgentSketches) -> Dict:
+    return {"estimate": sketches.prompts.count(), "relative_error": round(sketches.prompts.relative_error, 4)}
+
+
+def top_items(summary, counts, k: int, label: str) -> List[Dict]:
+    # Space-Saving and Count-Min both only overestimate, so the smaller of the two is the tighter bound
+    return [
+        {label: item, "count": min(count, counts.estimate(item)), "max_error": error}
+        for item, count, error in summary.top(k)
+    ]
+
+
+sketch_store = SketchStore(
+    retention_hours=settings.SKETCH_RETENTION_HOURS,
+    sync_seconds=settings.SKETCH_SYNC_SECONDS,
+)
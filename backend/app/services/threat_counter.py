@@ -0,0 +1,157 @@
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.events import truncate_time
+from app.db.models import Message
+
+UNSAFE_DECISIONS = ("block", "flag")
+
+
+class _AgentWindow:
+    """Ring of per-minute (total, unsafe) buckets with running sums."""
+
+    __slots__ = ("totals", "unsafe", "sum_total", "sum_unsafe", "head", "loaded_at")
+
+    def __init__(self, size: int, head: int):
+        self.totals = [0] * size
+        self.unsafe = [0] * size
+        self.sum_total = 0
+        self.sum_unsafe = 0
+        self.head = head # newest minute covered by the ring
+        self.loaded_at = time.monotonic()
+
+    def advance(self, minute: int):
+        size = len(self.totals)
+        if minute <= self.head:
+            return
+        if minute - self.head >= size:
+            # Whole window expired
+            self.totals = [0] * size
+            self.unsafe = [0] * size
+            self.sum_total = self.sum_unsafe = 0
+        else:
+            # Amortised O(1): each bucket is cleared at most once per minute
+            for m in range(self.head + 1, minute + 1):
+                i = m % size
+                self.sum_total -= self.totals[i]
+                self.sum_unsafe -= self.unsafe[i]
+                self.totals[i] = 0
+                self.unsafe[i] = 0
+        self.head = minute
+
+    def add(self, minute: int, total: int, unsafe: int):
+        size = len(self.totals)
+        if minute > self.head:
+            self.advance(minute)
+        elif minute <= self.head - size:
+            return # older than the window
+        i = minute % size
+        self.totals[i] += total
+        self.unsafe[i] += unsafe
+        self.sum_total += total
+        self.sum_unsafe += unsafe
+
+
+class ThreatCounter:
+    """
+    In-memory per-agent sliding window (bucketed by minute) of message verdicts.
+    Windows are seeded from the DB on first read and periodically resynced so that
+    verdicts recorded by other workers are picked up.
+    """
+
+    def __init__(self, window_minutes: int = 24 * 60, resync_seconds: float = 300):
+        self.window_minutes = window_minutes
+        self.resync_seconds = resync_seconds
+        self._windows: Dict[int, _AgentWindow] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _minute(ts: Optional[float] = None) -> int:
+        return int((ts if ts is not None else time.time()) // 60)
+
+    def is_warm(self, agent_id: int) -> bool:
+        window = self._windows.get(agent_id)
+        return window is not None and time.monotonic() - window.loaded_at < self.resync_seconds
+
+    def cold(self, agent_ids: Iterable[int]) -> list:
+        return [a for a in agent_ids if not self.is_warm(a)]
+
+    def seed(self, agent_id: int, buckets: Iterable[Tuple[float, int, int]]):
+        """Replaces an agent's window with (epoch_seconds, total, unsafe) minute buckets loaded from the DB."""
+        window = _AgentWindow(self.window_minutes, self._minute())
+        for ts, total, unsafe in buckets:
+            window.add(self._minute(ts), int(total or 0), int(unsafe or 0))
+        with self._lock:
+            self._windows[agent_id] = window
+
+    def record(self, agent_id: int, decision: str):
+        """Counts one message verdict. Cold agents are skipped; their next read seeds from the DB."""
+        with self._lock:
+            window = self._windows.get(agent_id)
+            if window is None:
+                return
+            window.add(self._minute(), 1, 1 if decision in UNSAFE_DECISIONS else 0)
+
+    def totals(self, agent_id: int) -> Tuple[int, int]:
+        with self._lock:
+            window = self._windows.get(agent_id)
+            if window is None:
+                return 0, 0
+            window.advance(self._minute())
+            return window.sum_total, window.sum_unsafe
+
+
+def threat_level(total: int, unsafe: int) -> Dict:
+    if total == 0:
+        return {"score": 0, "level": "low"}
+    score = int((unsafe / total) * 100)
+    level = "low"
+    if score > 30: level = "medium"
+    if score > 70: level = "high"
+    return {"score": score, "level": level}
+
+
+threat_counter = ThreatCounter(resync_seconds=settings.THREAT_COUNTER_RESYNC_SECONDS)
+
+
+async def _seed_windows(db: AsyncSession, agent_ids: List[int]):
+    """Loads the last 24h of verdicts for the given agents in one conditional-aggregate query."""
+    if not agent_ids:
+        return
+    since = datetime.utcnow() - timedelta(minutes=threat_counter.window_minutes)
+    minute = truncate_time(db, 'minute', Message.timestamp).label('minute')
+
+    query = select(
+        Message.agent_id,
+        minute,
+        func.count(Message.id),
+        func.sum(case((Message.decision.in_(UNSAFE_DECISIONS), 1), else_=0))
+    ).where(
+        Message.agent_id.in_(agent_ids),
+        Message.timestamp >= since
+    ).group_by(Message.agent_id, minute)
+
+    rows = (await db.execute(query)).all()
+
+    buckets = {agent_id: [] for agent_id in agent_ids}
+    for agent_id, bucket, total, unsafe in rows:
+        # Timestamps are naive UTC
+        buckets[agent_id].append((bucket.replace(tzinfo=timezone.utc).timestamp(), total, unsafe))
+    for agent_id, agent_buckets in buckets.items():
+        threat_counter.seed(agent_id, agent_buckets)
+
+
+async def threat_totals(db: AsyncSession, agent_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+    """(total, unsafe) message counts over the last 24h per agent; only cold agents hit the DB."""
+    await _seed_windows(db, threat_counter.cold(agent_ids))
+    return {agent_id: threat_counter.totals(agent_id) for agent_id in agent_ids}
+
+
+async def threat_scores(db: AsyncSession, agent_ids: List[int]) -> Dict[int, Dict]:
+    totals = await threat_totals(db, agent_ids)
+    return {agent_id: threat_level(*counts) for agent_id, counts in totals.items()}
@@ -0,0 +1,45 @@
+import hashlib
+import json
+import logging
+from typing import Callable, Dict, Optional
+from app.core.config import settings
+from app.core.state import state, StateBackend
+
+logger = logging.getLogger("Veridian.VerdictCache")
+
+
+class VerdictCache:
+    """
+    Reuses PRE/OSE verdicts for content already evaluated, so repeated prompts and outputs
+    skip the model call. Stored in the state backend, so with a shared backend a verdict
+    computed by one worker is reused by all. Backend failures fall back to evaluating.
+    """
+
+    def __init__(self, backend: StateBackend, ttl: float = 300):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(tenant_id: int, engine: str, content: str) -> str:
+        digest = hashlib.sha256(content.encode("utf-8", "replace")).hexdigest()
+        return f"verdict:{tenant_id}:{engine}:{digest}"
+
+    async def evaluate(self, tenant_id: int, engine: str, content: str, evaluate: Callable[[], Dict]) -> Dict:
+        key = self._key(tenant_id, engine, content)
+        cached: Optional[str] = None
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Verdict cache read failed: {e}")
+        if cached is not None:
+            return json.loads(cached)
+
+        result = evaluate()
+        try:
+            await self.backend.set(key, json.dumps(result, default=str), ttl=self.ttl)
+        except Exception as e:
+            logger.warning(f"Verdict cache write failed: {e}")
+        return result
+
+
+verdict_cache = VerdictCache(state, ttl=settings.VERDICT_CACHE_TTL)
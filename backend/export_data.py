@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+from datetime import datetime
+from app.services.export import export_service, EXPORT_TABLES, FORMATS
+
+async def export(args):
+    start = datetime.fromisoformat(args.start) if args.start else None
+    end = datetime.fromisoformat(args.end) if args.end else None
+    output = args.output or f"{args.table}.{FORMATS[args.format][1]}"
+
+    written = 0
+    with open(output, "wb") as f:
+        async for chunk in export_service.stream(args.table, args.format, args.tenant, start=start, end=end, agent_id=args.agent):
+            f.write(chunk)
+            written += len(chunk)
+    print(f"Wrote {written} bytes to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export tenant history as gzipped NDJSON, Parquet or Arrow.")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("--tenant", type=int, required=True)
+    parser.add_argument("--start", help="ISO timestamp (inclusive)")
+    parser.add_argument("--end", help="ISO timestamp (exclusive)")
+    parser.add_argument("--agent", type=int)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--output", "-o")
+    asyncio.run(export(parser.parse_args()))
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Before anything imports app.core.config: a throwaway SQLite database and in-process state
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["STATE_BACKEND_URL"] = "memory://"
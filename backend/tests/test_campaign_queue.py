@@ -0,0 +1,190 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.db.events import AsyncSessionLocal, engine, init_db
+from app.db.models import Campaign, Tenant
+from app.services.campaign_queue import CampaignQueue
+
+
+def run(coro):
+    async def main():
+        try:
+            await init_db()
+            return await coro
+        finally:
+            # Pooled connections belong to this event loop
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+async def _tenant(plan: str = "enterprise") -> int:
+    async with AsyncSessionLocal() as db:
+        tenant = Tenant(name=f"queue-{plan}", plan=plan)
+        db.add(tenant)
+        await db.commit()
+        return tenant.id
+
+
+async def _enqueue(tenant_id: int, count: int = 1) -> list:
+    async with AsyncSessionLocal() as db:
+        campaigns = [Campaign(tenant_id=tenant_id, status="queued", config={}) for _ in range(count)]
+        db.add_all(campaigns)
+        await db.commit()
+        return [campaign.id for campaign in campaigns]
+
+
+async def _campaign(campaign_id: int) -> Campaign:
+    async with AsyncSessionLocal() as db:
+        return await db.get(Campaign, campaign_id)
+
+
+async def _expire_lease(campaign_id: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Campaign).where(Campaign.id == campaign_id)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+def test_claim_leases_queued_campaigns_in_order():
+    async def scenario():
+        queue = CampaignQueue()
+        first, second = await _enqueue(await _tenant(), 2)
+        assert await queue.claim("w1") == first
+        assert await queue.claim("w2") == second
+        campaign = await _campaign(first)
+        assert (campaign.status, campaign.lease_owner, campaign.attempts) == ("running", "w1", 1)
+        assert campaign.lease_expires_at > datetime.utcnow()
+        assert await queue.heartbeat(first, "w1") == "running"
+        assert await queue.heartbeat(first, "w2") is None
+    run(scenario())
+
+
+def test_claim_respects_the_tenant_plan_limit():
+    async def scenario():
+        queue = CampaignQueue()
+        first, second = await _enqueue(await _tenant("free"), 2)
+        assert await queue.claim("w1") == first
+        # Free plan: one running campaign per tenant
+        assert await queue.claim("w2") is None
+        await queue.finish(first, "w1", "completed")
+        assert await queue.claim("w2") == second
+    run(scenario())
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_loses_it():
+    async def scenario():
+        queue = CampaignQueue()
+        [campaign_id] = await _enqueue(await _tenant())
+        assert await queue.claim("w1") == campaign_id
+        await _expire_lease(campaign_id)
+        assert await queue.claim("w2") == campaign_id
+        campaign = await _campaign(campaign_id)
+        assert (campaign.lease_owner, campaign.attempts) == ("w2", 2)
+        assert await queue.heartbeat(campaign_id, "w1") is None
+        # The old worker's final write is ignored
+        await queue.finish(campaign_id, "w1", "completed")
+        assert (await _campaign(campaign_id)).status == "running"
+    run(scenario())
+
+
+def test_campaign_failed_after_max_attempts():
+    async def scenario():
+        queue = CampaignQueue(max_attempts=2)
+        [campaign_id] = await _enqueue(await _tenant())
+        for worker in ("w1", "w2"):
+            assert await queue.claim(worker) == campaign_id
+            await _expire_lease(campaign_id)
+        assert await queue.claim("w3") is None
+        campaign = await _campaign(campaign_id)
+        assert (campaign.status, campaign.lease_owner) == ("failed", None)
+    run(scenario())
+
+
+def test_release_puts_a_campaign_back_in_the_queue():
+    async def scenario():
+        queue = CampaignQueue()
+        [campaign_id] = await _enqueue(await _tenant())
+        assert await queue.claim("w1") == campaign_id
+        await queue.release(campaign_id, "w1")
+        campaign = await _campaign(campaign_id)
+        assert (campaign.status, campaign.lease_owner, campaign.attempts) == ("queued", None, 0)
+        assert await queue.claim("w2") == campaign_id
+    run(scenario())
+
+
+def test_cancel_queued_and_running():
+    async def scenario():
+        queue = CampaignQueue()
+        tenant_id = await _tenant()
+        running, queued = await _enqueue(tenant_id, 2)
+        assert await queue.claim("w1") == running
+        async with AsyncSessionLocal() as db:
+            assert await queue.cancel(db, queued, tenant_id + 1000) is None # other tenant
+            assert await queue.cancel(db, queued, tenant_id) == "cancelled"
+            assert await queue.cancel(db, running, tenant_id) == "cancelling"
+        # The worker sees the request on its next heartbeat and settles the campaign
+        assert await queue.heartbeat(running, "w1") == "cancelling"
+        await queue.finish(running, "w1", "cancelled")
+        campaign = await _campaign(running)
+        assert (campaign.status, campaign.lease_owner, campaign.lease_expires_at) == ("cancelled", None, None)
+        assert campaign.finished_at is not None
+    run(scenario())
+
+
+def test_abandoned_cancelling_campaign_is_settled_as_cancelled():
+    async def scenario():
+        queue = CampaignQueue()
+        tenant_id = await _tenant()
+        [campaign_id] = await _enqueue(tenant_id)
+        assert await queue.claim("w1") == campaign_id
+        async with AsyncSessionLocal() as db:
+            assert await queue.cancel(db, campaign_id, tenant_id) == "cancelling"
+        await _expire_lease(campaign_id)
+        assert await queue.claim("w2") is None
+        assert (await _campaign(campaign_id)).status == "cancelled"
+    run(scenario())
+
+
+def test_finish_records_the_outcome_only_under_the_lease():
+    async def scenario():
+        queue = CampaignQueue()
+        tenant_id = await _tenant()
+        completed, cancelled = await _enqueue(tenant_id, 2)
+        assert await queue.claim("w1") == completed
+        assert await queue.claim("w1") == cancelled
+
+        assert not await queue.finish(completed, "w2", "completed")
+        assert await queue.finish(completed, "w1", "completed", stop_reason="settled", findings={"1": {"jailbreak": "resistant"}})
+        campaign = await _campaign(completed)
+        assert (campaign.status, campaign.stop_reason, campaign.lease_owner) == ("completed", "settled", None)
+        assert campaign.findings == {"1": {"jailbreak": "resistant"}}
+        # Finished campaigns are not reopened
+        assert not await queue.finish(completed, "w1", "failed")
+
+        # Cancelled while running: the run's outcome is kept but the status stays cancelled
+        async with AsyncSessionLocal() as db:
+            await queue.cancel(db, cancelled, tenant_id)
+        assert await queue.finish(cancelled, "w1", "completed", stop_reason="budget")
+        campaign = await _campaign(cancelled)
+        assert (campaign.status, campaign.stop_reason) == ("cancelled", "budget")
+    run(scenario())
+
+
+def test_worker_persists_the_runner_outcome(monkeypatch):
+    from app.services import campaign_worker as worker_module
+
+    async def fake_run(campaign_id):
+        return {"stop_reason": "deadline", "findings": {}}
+
+    monkeypatch.setattr(worker_module.redteam_runner, "run_campaign", fake_run)
+
+    async def scenario():
+        worker = worker_module.CampaignWorker()
+        [campaign_id] = await _enqueue(await _tenant())
+        assert await worker_module.campaign_queue.claim(worker.worker_id) == campaign_id
+        await worker._run_job(campaign_id)
+        campaign = await _campaign(campaign_id)
+        assert (campaign.status, campaign.stop_reason, campaign.lease_owner) == ("completed", "deadline", None)
+    run(scenario())
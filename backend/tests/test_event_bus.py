@@ -0,0 +1,22 @@
+import asyncio
+from app.core.state import SQLiteStateBackend
+from app.services.event_bus import EventBus
+
+
+def test_events_are_queued_for_the_shared_log_only_while_the_relay_runs(tmp_path):
+    async def run():
+        backend = SQLiteStateBackend(str(tmp_path / "state.db"))
+        bus = EventBus(backend)
+        subscription = bus.subscribe(1)
+        # No relay: delivered locally, nothing left queued
+        bus.publish(1, "incident", {"id": 1})
+        assert len(subscription.buffer) == 1
+        assert bus._outbox == []
+
+        bus.start()
+        bus.publish(1, "incident", {"id": 2})
+        bus.stop()
+        await bus.flush()
+        assert bus._outbox == []
+        assert len(await backend.read_events(EventBus.CHANNEL, None)) == 1
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+import asyncio
+from app.services.redteam.executor import CampaignExecutor, TargetSpec
+
+
+def test_clients_in_use_are_not_closed_on_eviction():
+    async def run():
+        executor = CampaignExecutor(max_clients=1)
+        busy = TargetSpec(url="http://a.example/chat", agent_id=1)
+        async with executor._client(busy) as in_use:
+            # A second target pushes the pool over its limit while the first client is still probing
+            async with executor._client(TargetSpec(url="http://b.example/chat", agent_id=2)):
+                pass
+            assert not in_use.is_closed
+            assert len(executor._clients) == 1
+        # Released: the busy client is now the least recently used idle one and goes
+        async with executor._client(TargetSpec(url="http://c.example/chat", agent_id=3)):
+            pass
+        assert in_use.is_closed
+        await executor.aclose()
+    asyncio.run(run())
+
+
+def test_slots_are_pruned_once_released():
+    async def run():
+        executor = CampaignExecutor(max_slots=2)
+        async with executor._slots("held", 1):
+            for i in range(5):
+                async with executor._slots(f"target:{i}", 1):
+                    pass
+            assert ("held", 1) in executor._targets
+        assert len(executor._targets) <= 2
+        await executor.aclose()
+    asyncio.run(run())
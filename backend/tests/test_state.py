@@ -0,0 +1,176 @@
+import asyncio
+import time
+from app.core.state import MemoryStateBackend, RedisStateBackend, SQLiteStateBackend
+
+
+class FakeRedis:
+    """Just enough of a RESP2 server for RedisStateBackend: strings, counters and expiry."""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay # seconds to stall before replying to GET
+        self.values = {}
+        self.expires = {}
+        self.connections = 0
+        self.open = 0
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"redis://127.0.0.1:{self._server.sockets[0].getsockname()[1]}/0"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self.open += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                writer.write(await self._reply(args))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.open -= 1
+            writer.close()
+
+    def _get(self, key):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return self.values.get(key)
+
+    @staticmethod
+    def _bulk(value) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value.encode()), value.encode())
+
+    async def _reply(self, args) -> bytes:
+        command, args = args[0].upper(), args[1:]
+        if command in ("PING", "SELECT"):
+            return b"+OK\r\n"
+        if command == "GET":
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return self._bulk(self._get(args[0]))
+        if command == "MGET":
+            return b"*%d\r\n" % len(args) + b"".join(self._bulk(self._get(key)) for key in args)
+        if command == "SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            if "NX" in options and self._get(key) is not None:
+                return b"$-1\r\n"
+            self.values[key] = value
+            self.expires.pop(key, None)
+            if "PX" in options:
+                self.expires[key] = time.monotonic() + int(args[2 + options.index("PX") + 1]) / 1000
+            return b"+OK\r\n"
+        if command in ("EXPIRE", "PEXPIRE"):
+            if self._get(args[0]) is None:
+                return b":0\r\n"
+            self.expires[args[0]] = time.monotonic() + int(args[1]) / (1 if command == "EXPIRE" else 1000)
+            return b":1\r\n"
+        if command == "DEL":
+            return b":%d\r\n" % sum(self.values.pop(key, None) is not None for key in args)
+        if command in ("INCRBY", "DECRBY"):
+            value = int(self._get(args[0]) or 0) + int(args[1]) * (1 if command == "INCRBY" else -1)
+            self.values[args[0]] = str(value)
+            return b":%d\r\n" % value
+        return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+
+async def _round_trip(backend):
+    assert await backend.get("missing") is None
+    assert await backend.set("a", "1")
+    assert not await backend.set("a", "2", nx=True)
+    assert await backend.get("a") == "1"
+    assert await backend.set("b", "2", ttl=0.2)
+    assert await backend.mget(["a", "b", "missing"]) == ["1", "2", None]
+    assert await backend.expire("a", 0.2)
+    assert not await backend.expire("missing", 1)
+    await asyncio.sleep(0.3)
+    assert await backend.mget(["a", "b"]) == [None, None]
+    await backend.set("c", "3")
+    await backend.delete("c")
+    assert await backend.get("c") is None
+
+
+async def _all_or_nothing(backend):
+    results = [await backend.rate_limit_many([("tenant", 10), ("agent", 2)], window=60) for _ in range(4)]
+    assert [[r.allowed for r in pair] for pair in results] == [[True, True], [True, True], [True, False], [True, False]]
+    # Only the two admitted requests were charged to the tenant
+    assert results[-1][0].remaining == 8
+    assert results[-1][1].retry_after > 0
+
+
+def test_memory_backend():
+    asyncio.run(_round_trip(MemoryStateBackend()))
+    asyncio.run(_all_or_nothing(MemoryStateBackend()))
+
+
+def test_sqlite_backend(tmp_path):
+    asyncio.run(_round_trip(SQLiteStateBackend(str(tmp_path / "state.db"))))
+    asyncio.run(_all_or_nothing(SQLiteStateBackend(str(tmp_path / "limits.db"))))
+
+
+def test_sqlite_backend_shared_between_instances(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    async def run():
+        await SQLiteStateBackend(path).set("k", "v")
+        assert await SQLiteStateBackend(path).get("k") == "v"
+        first = await SQLiteStateBackend(path).append_event("c", "one")
+        await SQLiteStateBackend(path).append_event("c", "two")
+        assert [data for _, data in await SQLiteStateBackend(path).read_events("c", first)] == ["two"]
+    asyncio.run(run())
+
+
+def test_redis_backend():
+    async def run():
+        server = FakeRedis()
+        backend = RedisStateBackend(await server.start())
+        try:
+            await _round_trip(backend)
+            results = [await backend.rate_limit_many([("tenant", 10), ("agent", 2)], window=60) for _ in range(4)]
+            assert [[r.allowed for r in pair] for pair in results] == [[True, True], [True, True], [True, False], [True, False]]
+            # Rejected requests are handed back to every bucket they touched
+            index = int(time.time() // 60)
+            assert server.values[f"rl:tenant:{index}"] == "2"
+            assert server.values[f"rl:agent:{index}"] == "2"
+            # Connections are pooled, not opened per call
+            assert server.connections == 1
+        finally:
+            await backend.close()
+            await server.stop()
+    asyncio.run(run())
+
+
+def test_redis_cancelled_pipeline_discards_connection():
+    async def run():
+        server = FakeRedis()
+        backend = RedisStateBackend(await server.start())
+        try:
+            await backend.set("k", "v")
+            server.delay = 0.5
+            try:
+                await asyncio.wait_for(backend.get("k"), timeout=0.1)
+            except asyncio.TimeoutError:
+                pass
+            # The half-read connection was closed rather than left open or pooled
+            await asyncio.sleep(0.6)
+            assert server.open == 0
+            assert backend._idle == []
+            server.delay = 0
+            await backend.set("k", "w")
+            assert await backend.get("k") == "w"
+            assert server.connections == 2
+        finally:
+            await backend.close()
+            await server.stop()
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.core.uploads import UploadLimitMiddleware
+
+app = FastAPI()
+app.add_middleware(UploadLimitMiddleware, max_bytes=1000)
+
+
+@app.post("/v1/sandbox/process")
+async def process(request: Request):
+    return {"size": len(await request.body())}
+
+
+def test_declared_and_streamed_bodies_are_capped():
+    limit = 1000 + UploadLimitMiddleware.OVERHEAD_BYTES
+    with TestClient(app) as client:
+        assert client.post("/v1/sandbox/process", content=b"x" * 100).json() == {"size": 100}
+        assert client.post("/v1/sandbox/process", content=b"x" * (limit + 1)).status_code == 413
+
+        def chunks():
+            # No Content-Length: cut off once the streamed bytes pass the cap
+            for _ in range(limit // 10000 + 2):
+                yield b"x" * 10000
+        assert client.post("/v1/sandbox/process", content=chunks()).status_code == 413